@@ -11,8 +11,9 @@ dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
 load_dotenv(dotenv_path)
 from src.services import (run_november_scenario, run_friday_scenario, run_pe_scenario, run_dynamic_scenario,
                           run_pe_16_17, run_pe_17_18, run_pe_18_19, run_pe_19_20, 
-                          run_pe_20_21, run_pe_21_22, run_pe_22_23,
-                          save_custom_query, get_saved_queries, run_saved_query, run_daily_insight_generation)
+                          run_pe_20_21, run_pe_21_22, run_pe_22_23, run_pe_ranges_batch,
+                          save_custom_query, get_saved_queries, run_saved_query, run_daily_insight_generation,
+                          start_backtester_warmup)
 from src.email_service import send_daily_email_task
 from src.user_service import (
     get_all_users, get_user_by_id, get_user_by_email, create_user, 
@@ -34,6 +35,27 @@ llm_service = LLMService()
 
 app = Flask(__name__)
 
+# Serialize API responses with orjson when it's installed: several times faster on the
+# large signal payloads, handles numpy scalars natively and writes NaN as null.
+# Key sorting and the fallback for other types match Flask's default provider.
+try:
+    import orjson
+    from flask.json.provider import DefaultJSONProvider
+
+    class OrjsonProvider(DefaultJSONProvider):
+        _options = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS |
+                    orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(obj, default=self.default, option=self._options).decode('utf-8')
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+    app.json = OrjsonProvider(app)
+except ImportError:
+    pass
+
 # --- Background Scheduler Setup ---
 def scheduled_analysis_task():
     print("Scheduler: Starting scheduled daily analysis task...")
@@ -56,6 +78,9 @@ scheduler.add_job(func=scheduled_analysis_task, trigger="interval", minutes=60)
 scheduler.add_job(func=send_daily_email_task, trigger="cron", day_of_week='mon-fri', hour=13, minute=0)
 scheduler.start()
 
+# Load market data off the request path so the first backtest doesn't wait on yfinance
+start_backtester_warmup()
+
 # Shut down the scheduler when exiting the app
 atexit.register(lambda: scheduler.shutdown())
 # ----------------------------------
@@ -147,6 +172,14 @@ def backtest_pe_22_23():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/backtest/pe-ranges', methods=['GET'])
+def backtest_pe_ranges():
+    try:
+        results = run_pe_ranges_batch()
+        return jsonify(results)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/backtest/ask', methods=['POST'])
 def ask_question():
     try:
@@ -303,7 +336,8 @@ def run_saved_query_endpoint(query_id):
 @app.route('/api/email/test', methods=['POST'])
 def test_email():
     try:
-        result = send_daily_email_task()
+        # Manual test sends bypass the "already sent today" dedup
+        result = send_daily_email_task(force=True)
         if result and "error" in result:
             return jsonify(result), 500
         return jsonify({"status": "success", "message": "Email sent (check server logs for details)"})
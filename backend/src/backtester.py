@@ -1,9 +1,14 @@
 import pandas as pd
 import numpy as np
 
+# Placeholder returned in place of a period's stats when no forward returns exist for it
+MISSING_DATA = "Data not available"
+
 class Backtester:
     def __init__(self, data):
         self.data = data.copy()
+        # Baseline stats depend only on the data and the periods; keyed by periods tuple
+        self._baseline_cache = {}
         self._precalculate_forward_returns()
 
     def _precalculate_forward_returns(self):
@@ -103,7 +108,7 @@ class Backtester:
                     
                 results[period] = stats
             else:
-                results[period] = "Data not available"
+                results[period] = MISSING_DATA
                 
         return results
 
@@ -167,7 +172,13 @@ class Backtester:
     def get_baseline_stats(self, periods=['1M', '3M', '6M', '1Y', '3Y', '5Y', '10Y']):
         """
         Calculates baseline statistics for the entire dataset (control group).
+        Results are cached per periods list, since the data doesn't change.
         """
-        # Create a mask of all True values
-        mask = pd.Series([True] * len(self.data), index=self.data.index)
-        return self.analyze(mask, periods=periods)
+        key = tuple(periods)
+        cached = self._baseline_cache.get(key)
+        if cached is None:
+            # Create a mask of all True values
+            mask = pd.Series(True, index=self.data.index)
+            cached = self.analyze(mask, periods=periods)
+            self._baseline_cache[key] = cached
+        return dict(cached)
@@ -1,5 +1,6 @@
 import yfinance as yf
 import pandas as pd
+import numpy as np
 import os
 
 class DataLoader:
@@ -45,7 +46,9 @@ class DataLoader:
         if isinstance(df.columns, pd.MultiIndex):
             df.columns = df.columns.get_level_values(0)
             
-        df.index = pd.to_datetime(df.index)
+        # yf.download already returns a DatetimeIndex; only convert when it doesn't
+        if not isinstance(df.index, pd.DatetimeIndex):
+            df.index = pd.to_datetime(df.index)
         
         # Basic cleanup
         if 'Adj Close' not in df.columns and 'Close' in df.columns:
@@ -84,7 +87,14 @@ class DataLoader:
         
         # Sort by date and remove duplicates
         pe_df = pe_df.sort_index()
-        pe_df = pe_df[~pe_df.index.duplicated(keep='first')]
+        # After sorting, duplicates are adjacent - a single vectorized compare
+        # over the int64 timestamps replaces pandas' hash-based duplicated()
+        if len(pe_df) > 1:
+            vals = pe_df.index.values.view('i8')
+            keep = np.empty(len(vals), dtype=bool)
+            keep[0] = True
+            np.not_equal(vals[1:], vals[:-1], out=keep[1:])
+            pe_df = pe_df.iloc[keep]
         
         return pe_df
 
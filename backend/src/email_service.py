@@ -1,28 +1,54 @@
 import os
 import json
+import hashlib
+import functools
 import smtplib
-import matplotlib
-# Set backend to Agg to prevent GUI window errors
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+import threading
+import concurrent.futures
 import io
+import itertools
+import math
+import re
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.image import MIMEImage
 from datetime import datetime
+from collections import OrderedDict
 from dotenv import load_dotenv
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from markupsafe import Markup, escape
 from .user_service import (
     get_users_by_content_type, get_user_by_id, get_user_holdings,
-    get_cached_portfolio_news, save_cached_portfolio_news, should_refresh_portfolio_news
+    get_cached_portfolio_news, save_cached_portfolio_news, should_refresh_portfolio_news,
+    get_recently_sent_keys, record_sent_emails
 )
 from .watchlist_service import get_watchlist_for_email, get_ticker_data
 
 # Load env vars if not already loaded
 load_dotenv()
 
+# Daily email layout, compiled once at import (backend/templates/daily_email.html.j2)
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates')
+_template_env = Environment(
+    loader=FileSystemLoader(TEMPLATES_DIR),
+    autoescape=select_autoescape(['html', 'j2']),
+    trim_blocks=True,
+    lstrip_blocks=False,
+)
+DAILY_EMAIL_TEMPLATE = _template_env.get_template('daily_email.html.j2')
+QUESTION_CARDS_TEMPLATE = _template_env.get_template('question_cards.html.j2')
+
 # Content type identifier for this email type
 CONTENT_TYPE_ID = "quantitative_analysis"
 
+# Written by services.run_daily_insight_generation
+DAILY_ANALYSIS_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'daily_analysis.json')
+
+# Content types that render per-user sections (watchlist, holdings) into the email body
+PERSONALIZED_CONTENT_TYPES = frozenset({"watchlist_news", "portfolio_news"})
+
 GLOSSARY = {
     "VIX": "The CBOE Volatility Index, often called the 'fear gauge'. It measures expected market volatility over the next 30 days based on S&P 500 options.",
     "Z-Score": "A statistical measurement that describes a value's relationship to the mean of a group of values. Z-score is measured in terms of standard deviations from the mean.",
@@ -40,82 +66,466 @@ GLOSSARY = {
     "Baseline": "The average performance of the market (S&P 500) over the same time periods, used as a benchmark to compare against the specific signal."
 }
 
+# Single-pass glossary matcher: one alternation over the lowercased terms, compiled once.
+# The zero-width lookahead reports overlapping hits (e.g. "rsi" inside "mean reversion"),
+# matching the old per-term substring check.
+_GLOSSARY_BY_LOWER = {term.lower(): (term, definition) for term, definition in GLOSSARY.items()}
+_GLOSSARY_RE = re.compile(
+    "(?=(" + "|".join(re.escape(t) for t in sorted(_GLOSSARY_BY_LOWER, key=len, reverse=True)) + "))"
+)
+
+def find_glossary_terms(text):
+    """Return (term, definition) pairs found in lowercased text, in first-occurrence order."""
+    used_terms = {}
+    for match in _GLOSSARY_RE.finditer(text):
+        key = match.group(1)
+        if key not in used_terms:
+            used_terms[key] = _GLOSSARY_BY_LOWER[key]
+            if len(used_terms) == len(_GLOSSARY_BY_LOWER):
+                break
+    return list(used_terms.values())
+
+# Shared read-only default for missing nested dicts (avoids allocating a new {} per .get miss)
+_EMPTY = {}
+
+# Display order for forward-return periods
+PERIOD_ORDER = ('1W', '1M', '3M', '6M', '1Y', '3Y', '5Y', '10Y')
+_KNOWN_PERIODS = frozenset(PERIOD_ORDER)
+
+def _ordered_periods(stats_data):
+    """Period keys with dict stats in display order; custom periods (e.g. '5D') follow in original order."""
+    periods = [p for p in PERIOD_ORDER if isinstance(stats_data.get(p), dict)]
+    periods.extend(k for k, v in stats_data.items()
+                   if k not in _KNOWN_PERIODS and k != 'count' and isinstance(v, dict))
+    return periods
+
 def format_percentage(val):
     if val is None: return "N/A"
     if isinstance(val, str): return val
     return f"{val * 100:.2f}%"
 
-def generate_chart_image(results_data, control_data):
+def format_percentages(values):
+    """Vectorized format_percentage for a list of values; falls back per item for None/str."""
+    if not values:
+        return []
+    if all(isinstance(v, (int, float)) for v in values):
+        return np.char.mod("%.2f%%", np.asarray(values, dtype=np.float64) * 100).tolist()
+    return [format_percentage(v) for v in values]
+
+# Chart renderer: 'pil' (default, lightweight) or 'matplotlib' (original path, kept for parity testing)
+CHART_RENDERER = os.environ.get("CHART_RENDERER", "pil").lower()
+
+# Chart geometry/colors shared by both renderers (6 x 3.5 in @ 100 dpi)
+CHART_SIZE = (600, 350)
+CHART_BG = '#f3f4f6'
+CHART_SIGNAL_COLOR = '#3b82f6'
+CHART_BASELINE_COLOR = '#9ca3af'
+CHART_AXIS_COLOR = '#4b5563'
+CHART_GRID_COLOR = '#d1d5db'
+
+_chart_fonts = {}
+
+
+def _get_chart_font(size):
+    """Loads (once per size) the system DejaVu Sans font, falling back to Pillow's bundled scalable font."""
+    font = _chart_fonts.get(size)
+    if font is None:
+        try:
+            # Pillow searches the system font directories for a bare file name
+            font = ImageFont.truetype('DejaVuSans.ttf', size)
+        except OSError:
+            font = ImageFont.load_default(size=size)
+        _chart_fonts[size] = font
+    return font
+
+
+def _chart_series(results_data, control_data):
     """
-    Generates a bar chart comparing Signal vs Baseline for available periods.
+    Extracts (labels, signal_means, baseline_means) in percent for the chart.
+    Returns None if there are no periods to plot.
+    """
+    # Extract periods that exist in both (or just results)
+    periods = _ordered_periods(results_data)
+
+    if not periods:
+        return None
+
+    signal_means = [results_data[p]['mean'] * 100 for p in periods]
+
+    baseline_means = []
+    if control_data:
+        for p in periods:
+            if p in control_data and isinstance(control_data[p], dict):
+                baseline_means.append(control_data[p]['mean'] * 100)
+            else:
+                baseline_means.append(0)
+    else:
+        baseline_means = [0] * len(periods)
+
+    return periods, signal_means, baseline_means
+
+
+def _nice_ticks(lo, hi, max_ticks=6):
+    """Returns evenly spaced 'nice' tick values (1/2/5 x 10^n steps) covering [lo, hi]."""
+    span = hi - lo
+    if span <= 0:
+        span = 1.0
+    raw_step = span / max(max_ticks - 1, 1)
+    magnitude = 10 ** math.floor(math.log10(raw_step))
+    for mult in (1, 2, 5, 10):
+        step = mult * magnitude
+        if step >= raw_step:
+            break
+    first = math.floor(lo / step) * step
+    last = math.ceil(hi / step) * step
+    count = int(round((last - first) / step))
+    return [first + i * step for i in range(count + 1)]
+
+
+def generate_chart_image_pil(results_data, control_data):
+    """
+    Draws the Signal vs Baseline bar chart directly with Pillow's ImageDraw.
+    Same layout as the matplotlib chart without the figure/axes/renderer stack.
     Returns the image as a bytes object.
     """
     try:
-        # Extract periods that exist in both (or just results)
-        periods = [k for k in results_data.keys() if k != 'count' and k in results_data and isinstance(results_data[k], dict)]
-        
-        # Sort periods logically if possible
-        order = ['1W', '1M', '3M', '6M', '1Y', '3Y', '5Y', '10Y']
-        periods = sorted(periods, key=lambda x: order.index(x) if x in order else 999)
-        
-        if not periods:
+        series = _chart_series(results_data, control_data)
+        if series is None:
             return None
+        labels, signal_means, baseline_means = series
+
+        width, height = CHART_SIZE
+        img = Image.new('RGB', CHART_SIZE, CHART_BG)
+        draw = ImageDraw.Draw(img)
+        font = _get_chart_font(11)
+
+        # Plot area
+        left, right, top, bottom = 70, width - 20, 20, height - 35
+
+        values = signal_means + baseline_means
+        ticks = _nice_ticks(min(0, min(values)), max(0, max(values)))
+        y_min, y_max = ticks[0], ticks[-1]
+        if y_max == y_min:
+            y_max = y_min + 1
+
+        def to_y(v):
+            return bottom - (v - y_min) / (y_max - y_min) * (bottom - top)
+
+        # Horizontal grid + y tick labels
+        for t in ticks:
+            y = to_y(t)
+            for gx in range(left, right, 8):
+                draw.line([(gx, y), (min(gx + 4, right), y)], fill=CHART_GRID_COLOR)
+            label = f"{t:g}"
+            tw = draw.textlength(label, font=font)
+            draw.text((left - 6 - tw, y), label, fill=CHART_AXIS_COLOR, font=font, anchor='lm')
+
+        # Y axis label (rotated)
+        ylabel = 'Average Return (%)'
+        lw = int(draw.textlength(ylabel, font=font)) + 4
+        label_img = Image.new('RGB', (lw, 16), CHART_BG)
+        ImageDraw.Draw(label_img).text((2, 8), ylabel, fill=CHART_AXIS_COLOR, font=font, anchor='lm')
+        label_img = label_img.rotate(90, expand=True)
+        img.paste(label_img, (8, int((top + bottom) / 2 - lw / 2)))
+
+        # Bars
+        slot = (right - left) / len(labels)
+        bar_w = slot * 0.35
+        zero_y = to_y(0)
+        for i, label in enumerate(labels):
+            center = left + slot * (i + 0.5)
+            for offset, val, color in ((-bar_w, signal_means[i], CHART_SIGNAL_COLOR),
+                                       (0, baseline_means[i], CHART_BASELINE_COLOR)):
+                x0 = center + offset
+                y0, y1 = sorted((zero_y, to_y(val)))
+                draw.rectangle([x0, y0, x0 + bar_w, y1], fill=color)
+            draw.text((center, bottom + 6), label, fill=CHART_AXIS_COLOR, font=font, anchor='mt')
+
+        # Axes (left + bottom spines only)
+        draw.line([(left, top), (left, bottom)], fill=CHART_AXIS_COLOR)
+        draw.line([(left, bottom), (right, bottom)], fill=CHART_AXIS_COLOR)
+
+        # Legend (top right)
+        lx, ly = right - 90, top + 4
+        draw.rectangle([lx - 6, ly - 2, right - 4, ly + 32], fill='#ffffff', outline=CHART_GRID_COLOR)
+        for name, color in (('Signal', CHART_SIGNAL_COLOR), ('Baseline', CHART_BASELINE_COLOR)):
+            draw.rectangle([lx, ly + 2, lx + 14, ly + 10], fill=color)
+            draw.text((lx + 20, ly + 6), name, fill=CHART_AXIS_COLOR, font=font, anchor='lm')
+            ly += 16
+
+        buf = io.BytesIO()
+        img.save(buf, format='PNG', compress_level=3)
+        return buf.getvalue()
+
+    except Exception as e:
+        print(f"Error generating chart: {e}")
+        return None
+
+
+# matplotlib.pyplot is imported on first use - it is only needed by the matplotlib renderer
+# and costs a few hundred ms (font cache, rcParams) for every process importing this module
+plt = None
+
+
+def _get_pyplot():
+    """Imports matplotlib.pyplot (Agg backend) on first call and returns it."""
+    global plt
+    if plt is None:
+        import matplotlib
+        # Set backend to Agg to prevent GUI window errors
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as pyplot
+        plt = pyplot
+    return plt
 
-        # Prepare data
-        labels = periods
-        signal_means = [results_data[p]['mean'] * 100 for p in periods]
-        
-        baseline_means = []
-        if control_data:
-            for p in periods:
-                if p in control_data and isinstance(control_data[p], dict):
-                    baseline_means.append(control_data[p]['mean'] * 100)
-                else:
-                    baseline_means.append(0)
-        else:
-            baseline_means = [0] * len(periods)
+
+# Single matplotlib Figure reused across charts (created on first use, guarded by a lock)
+_mpl_fig = None
+_mpl_ax = None
+_mpl_lock = threading.Lock()
+
+
+def _get_mpl_figure():
+    """Returns the shared (fig, ax) pair, creating it on first use. Caller must hold _mpl_lock."""
+    global _mpl_fig, _mpl_ax
+    if _mpl_fig is None:
+        _mpl_fig, _mpl_ax = _get_pyplot().subplots(figsize=(6, 3.5))
+        # Set dark style colors manually since 'dark_background' might look too harsh on white email
+        # Let's use a clean light style for email compatibility
+        _mpl_fig.patch.set_facecolor(CHART_BG)
+    return _mpl_fig, _mpl_ax
+
+
+def generate_chart_image_mpl(results_data, control_data):
+    """
+    Generates a bar chart comparing Signal vs Baseline for available periods using matplotlib.
+    Returns the image as a bytes object.
+    """
+    try:
+        series = _chart_series(results_data, control_data)
+        if series is None:
+            return None
+        labels, signal_means, baseline_means = series
 
         # Plotting
         x = range(len(labels))
         width = 0.35
-        
-        fig, ax = plt.subplots(figsize=(6, 3.5))
-        
-        # Set dark style colors manually since 'dark_background' might look too harsh on white email
-        # Let's use a clean light style for email compatibility
-        fig.patch.set_facecolor('#f3f4f6')
-        ax.set_facecolor('#f3f4f6')
-        
-        rects1 = ax.bar([i - width/2 for i in x], signal_means, width, label='Signal', color='#3b82f6')
-        rects2 = ax.bar([i + width/2 for i in x], baseline_means, width, label='Baseline', color='#9ca3af')
-
-        # Add some text for labels, title and custom x-axis tick labels, etc.
-        ax.set_ylabel('Average Return (%)')
-        ax.set_xticks(x)
-        ax.set_xticklabels(labels)
-        ax.legend()
-        
-        # Add horizontal grid
-        ax.yaxis.grid(True, linestyle='--', alpha=0.3, color='gray')
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-        ax.spines['left'].set_color('#4b5563')
-        ax.spines['bottom'].set_color('#4b5563')
-
-        plt.tight_layout()
-        
-        # Save to buffer
+
+        with _mpl_lock:
+            fig, ax = _get_mpl_figure()
+            ax.clear()
+            ax.set_facecolor(CHART_BG)
+
+            ax.bar([i - width/2 for i in x], signal_means, width, label='Signal', color=CHART_SIGNAL_COLOR)
+            ax.bar([i + width/2 for i in x], baseline_means, width, label='Baseline', color=CHART_BASELINE_COLOR)
+
+            # Add some text for labels, title and custom x-axis tick labels, etc.
+            ax.set_ylabel('Average Return (%)')
+            ax.set_xticks(x)
+            ax.set_xticklabels(labels)
+            ax.legend()
+
+            # Add horizontal grid
+            ax.yaxis.grid(True, linestyle='--', alpha=0.3, color='gray')
+            ax.spines['top'].set_visible(False)
+            ax.spines['right'].set_visible(False)
+            ax.spines['left'].set_color(CHART_AXIS_COLOR)
+            ax.spines['bottom'].set_color(CHART_AXIS_COLOR)
+
+            fig.tight_layout()
+
+            # Rasterize on the Agg canvas and hand the pixel buffer straight to Pillow,
+            # skipping savefig's print_figure round-trip (facecolor swap, bbox handling)
+            fig.canvas.draw()
+            width, height = fig.canvas.get_width_height()
+            img = Image.frombuffer('RGBA', (width, height), fig.canvas.buffer_rgba(), 'raw', 'RGBA', 0, 1).convert('RGB')
+
+        # Low zlib level and no optimizer pass: flat bar charts compress well anyway
         buf = io.BytesIO()
-        plt.savefig(buf, format='png', facecolor=fig.get_facecolor(), edgecolor='none')
-        buf.seek(0)
-        plt.close(fig)
+        img.save(buf, format='PNG', compress_level=3)
         return buf.getvalue()
-        
+
     except Exception as e:
         print(f"Error generating chart: {e}")
         return None
 
 
+def generate_chart_image(results_data, control_data):
+    """
+    Generates a bar chart comparing Signal vs Baseline for available periods.
+    Uses the Pillow renderer unless CHART_RENDERER=matplotlib.
+    Returns the image as a bytes object.
+    """
+    if CHART_RENDERER == 'matplotlib':
+        return generate_chart_image_mpl(results_data, control_data)
+    return generate_chart_image_pil(results_data, control_data)
+
+
+# Rendered chart PNGs keyed by a content hash of their input data (LRU, in-process)
+CHART_CACHE_MAX_SIZE = 256
+_chart_cache = OrderedDict()
+
+
+def _chart_cache_key(results_data, control_data) -> bytes:
+    """Canonical blake2b digest of the chart inputs."""
+    payload = json.dumps((results_data, control_data), sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).digest()
+
+
+def get_chart_image(results_data, control_data):
+    """
+    Cached wrapper around generate_chart_image.
+    Identical (results_data, control_data) payloads reuse the previously rendered PNG.
+    """
+    key = _chart_cache_key(results_data, control_data)
+    cached = _chart_cache.get(key)
+    if cached is not None:
+        _chart_cache.move_to_end(key)
+        return cached
+
+    img_data = generate_chart_image(results_data, control_data)
+    _store_chart(key, img_data)
+    return img_data
+
+
+def _store_chart(key, img_data):
+    """Adds a rendered chart to the LRU cache, evicting the oldest entry when full."""
+    if img_data:
+        _chart_cache[key] = img_data
+        if len(_chart_cache) > CHART_CACHE_MAX_SIZE:
+            _chart_cache.popitem(last=False)
+
+
+def generate_question_charts(questions: list) -> list:
+    """
+    Renders the chart for every question that has backtest results.
+    Goes through get_chart_image, so cached charts are reused and a chart shared by
+    several questions is rendered once. Rendered inline: a Pillow chart takes a few ms.
+
+    Returns: list of (cid, png_bytes) tuples, in question order
+    """
+    images = []
+    for i, q in enumerate(questions):
+        q_results = q.get('results')
+        if isinstance(q_results, dict):
+            img_data = get_chart_image(q_results.get('results') or _EMPTY, q_results.get('control') or _EMPTY)
+            if img_data:
+                images.append((f"chart_{i}", img_data))
+    return images
+
+
+# --- Static HTML fragments for the watchlist / portfolio sections (built once at import) ---
+_WATCHLIST_HEADER = """
+        <div style="margin: 24px 0; border-top: 2px solid #e5e7eb; padding-top: 24px;">
+            <h3 style="margin: 0 0 16px 0; color: #111827; font-size: 20px;">
+                📋 Your Watchlist
+            </h3>
+    """
+
+_WATCHLIST_COUNT_TEMPLATE = """
+            <p style="font-size: 12px; color: #6b7280; margin-bottom: 16px;">
+                Showing top {showing} of {total_in_watchlist} stocks (sorted by news activity)
+            </p>
+        """
+
+_PORTFOLIO_HEADER = """
+        <div style="margin: 24px 0; border-top: 2px solid #e5e7eb; padding-top: 24px;">
+            <h3 style="margin: 0 0 16px 0; color: #111827; font-size: 20px;">
+                📈 Portfolio Highlights
+            </h3>
+            <p style="font-size: 12px; color: #6b7280; margin-bottom: 16px;">
+                Top movers and news from your portfolio
+            </p>
+    """
+
+# Card header shared by watchlist and portfolio stocks.
+# The section templates below are filled with str.format: escape() any third-party text
+# (tickers, company names, headlines, LLM summaries) before interpolating it.
+_STOCK_CARD_TEMPLATE = """
+            <div style="border: 1px solid #e5e7eb; border-radius: 8px; margin-bottom: 12px; overflow: hidden;">
+                <div style="padding: 12px 16px; display: flex; justify-content: space-between; align-items: center; background-color: #f8fafc; border-bottom: 1px solid #e5e7eb;">
+                    <div>
+                        <span style="font-weight: 700; color: #111827; font-size: 16px;">{ticker}</span>
+                        <span style="color: #6b7280; font-size: 13px; margin-left: 8px;">{name}</span>
+                    </div>
+                    <div style="text-align: right;">
+                        <span style="font-weight: 600; color: #374151; font-size: 15px;">{price_text}</span>
+                        <span style="margin-left: 8px; padding: 4px 8px; border-radius: 4px; font-weight: 600; font-size: 13px; background-color: {perf_bg}; color: {perf_color};">
+                            {perf_text}
+                        </span>
+                    </div>
+                </div>
+                <div style="padding: 12px 16px;">
+        """
+
+_STOCK_CARD_CLOSE = """
+                </div>
+            </div>
+        """
+
+_WATCHLIST_HEADLINES_HEADER = """
+                    <div style="font-size: 12px; color: #6b7280; text-transform: uppercase; letter-spacing: 0.5px; margin-bottom: 8px;">Recent Headlines</div>
+                    <ul style="margin: 0; padding-left: 16px; color: #374151; font-size: 13px;">
+            """
+
+_PORTFOLIO_HEADLINES_HEADER = """
+                    <div style="font-size: 12px; color: #6b7280; text-transform: uppercase; letter-spacing: 0.5px; margin-bottom: 6px;">Recent Headlines</div>
+                    <ul style="margin: 0; padding-left: 16px; color: #374151; font-size: 13px;">
+            """
+
+_HEADLINE_ITEM_TEMPLATE = '<li style="margin-bottom: 4px;">{headline}</li>'
+
+_MORE_ARTICLES_TEMPLATE = """
+                    <p style="font-size: 12px; color: #9ca3af; margin: 8px 0 0 0;">
+                        +{more_count} more articles
+                    </p>
+                """
+
+_NO_NEWS_HTML = """
+                    <p style="color: #9ca3af; font-size: 13px; font-style: italic; margin: 0;">
+                        No significant news today. The stock is trading normally without major catalysts.
+                    </p>
+            """
+
+_AI_SUMMARY_TEMPLATE = """
+                    <div style="margin-bottom: 12px; padding: 10px; background-color: #f9fafb; border-radius: 6px; border-left: 3px solid {sent_color};">
+                        <div style="font-size: 12px; color: #6b7280; margin-bottom: 4px;">{sent_emoji} AI Analysis</div>
+                        <p style="margin: 0; font-size: 13px; color: #374151; line-height: 1.5;">{summary}</p>
+                    </div>
+            """
+
+
+# Daily change badge (color, background, arrow) keyed by sign of the change
+_CHANGE_STYLES = {
+    1: ("#059669", "#d1fae5", "▲"),   # Green
+    -1: ("#dc2626", "#fee2e2", "▼"),  # Red
+    0: ("#6b7280", "#f3f4f6", "–"),   # Gray
+}
+
+# Sentiment badge (color, background, emoji)
+_SENTIMENT_STYLES = {
+    'very_positive': ('#065f46', '#d1fae5', '🚀'),
+    'positive': ('#059669', '#d1fae5', '📈'),
+    'neutral': ('#6b7280', '#f3f4f6', '➡️'),
+    'negative': ('#dc2626', '#fee2e2', '📉'),
+    'very_negative': ('#991b1b', '#fee2e2', '⚠️')
+}
+
+
+def _truncate(text: str, limit: int) -> str:
+    """Cuts text to limit characters, adding '...' when it was longer."""
+    return text if len(text) <= limit else f"{text[:limit]}..."
+
+
+def _change_style(change_pct):
+    """Returns (perf_color, perf_bg, perf_text) for a daily percent change (None -> N/A)."""
+    if change_pct is None:
+        return "#6b7280", "#f3f4f6", "N/A"
+    sign = (change_pct > 0) - (change_pct < 0)
+    perf_color, perf_bg, arrow = _CHANGE_STYLES[sign]
+    return perf_color, perf_bg, f"{arrow} {'+' if sign > 0 else ''}{change_pct:.2f}%"
+
+
 def generate_watchlist_html(user: dict) -> str:
     """
     Generate HTML section for a user's watchlist.
@@ -142,100 +552,92 @@ def generate_watchlist_html(user: dict) -> str:
     
     tickers = watchlist_data.get('tickers', [])
     
-    html_parts = []
-    html_parts.append("""
-        <div style="margin: 24px 0; border-top: 2px solid #e5e7eb; padding-top: 24px;">
-            <h3 style="margin: 0 0 16px 0; color: #111827; font-size: 20px;">
-                📋 Your Watchlist
-            </h3>
-    """)
+    html_parts = [_WATCHLIST_HEADER]
     
     # Show count info if some tickers were excluded
     if watchlist_data.get('excluded_count', 0) > 0:
-        html_parts.append(f"""
-            <p style="font-size: 12px; color: #6b7280; margin-bottom: 16px;">
-                Showing top {watchlist_data['showing']} of {watchlist_data['total_in_watchlist']} stocks (sorted by news activity)
-            </p>
-        """)
+        html_parts.append(_WATCHLIST_COUNT_TEMPLATE.format_map(watchlist_data))
     
     for t in tickers:
         # Determine color based on performance
-        change_pct = t.get('change_percent')
-        if change_pct is not None:
-            if change_pct > 0:
-                perf_color = "#059669"  # Green
-                perf_bg = "#d1fae5"
-                arrow = "▲"
-            elif change_pct < 0:
-                perf_color = "#dc2626"  # Red
-                perf_bg = "#fee2e2"
-                arrow = "▼"
-            else:
-                perf_color = "#6b7280"  # Gray
-                perf_bg = "#f3f4f6"
-                arrow = "–"
-            perf_text = f"{arrow} {'+' if change_pct > 0 else ''}{change_pct:.2f}%"
-        else:
-            perf_color = "#6b7280"
-            perf_bg = "#f3f4f6"
-            perf_text = "N/A"
+        perf_color, perf_bg, perf_text = _change_style(t.get('change_percent'))
         
         price = t.get('price')
         price_text = f"${price:.2f}" if price else "N/A"
         
         headlines = t.get('headlines', [])
         
-        html_parts.append(f"""
-            <div style="border: 1px solid #e5e7eb; border-radius: 8px; margin-bottom: 12px; overflow: hidden;">
-                <div style="padding: 12px 16px; display: flex; justify-content: space-between; align-items: center; background-color: #f8fafc; border-bottom: 1px solid #e5e7eb;">
-                    <div>
-                        <span style="font-weight: 700; color: #111827; font-size: 16px;">{t['ticker']}</span>
-                        <span style="color: #6b7280; font-size: 13px; margin-left: 8px;">{t['name']}</span>
-                    </div>
-                    <div style="text-align: right;">
-                        <span style="font-weight: 600; color: #374151; font-size: 15px;">{price_text}</span>
-                        <span style="margin-left: 8px; padding: 4px 8px; border-radius: 4px; font-weight: 600; font-size: 13px; background-color: {perf_bg}; color: {perf_color};">
-                            {perf_text}
-                        </span>
-                    </div>
-                </div>
-                <div style="padding: 12px 16px;">
-        """)
+        html_parts.append(_STOCK_CARD_TEMPLATE.format(
+            ticker=escape(t['ticker']), name=escape(t['name']), price_text=price_text,
+            perf_bg=perf_bg, perf_color=perf_color, perf_text=perf_text
+        ))
         
         if headlines:
-            html_parts.append("""
-                    <div style="font-size: 12px; color: #6b7280; text-transform: uppercase; letter-spacing: 0.5px; margin-bottom: 8px;">Recent Headlines</div>
-                    <ul style="margin: 0; padding-left: 16px; color: #374151; font-size: 13px;">
-            """)
+            html_parts.append(_WATCHLIST_HEADLINES_HEADER)
             for h in headlines[:3]:
                 # Truncate long headlines
-                headline = h[:100] + "..." if len(h) > 100 else h
-                html_parts.append(f'<li style="margin-bottom: 4px;">{headline}</li>')
+                html_parts.append(_HEADLINE_ITEM_TEMPLATE.format(headline=escape(_truncate(h, 100))))
             html_parts.append("</ul>")
             
             if t.get('news_count', 0) > 3:
-                html_parts.append(f"""
-                    <p style="font-size: 12px; color: #9ca3af; margin: 8px 0 0 0;">
-                        +{t['news_count'] - 3} more articles
-                    </p>
-                """)
+                html_parts.append(_MORE_ARTICLES_TEMPLATE.format(more_count=t['news_count'] - 3))
         else:
-            html_parts.append("""
-                    <p style="color: #9ca3af; font-size: 13px; font-style: italic; margin: 0;">
-                        No significant news today. The stock is trading normally without major catalysts.
-                    </p>
-            """)
+            html_parts.append(_NO_NEWS_HTML)
         
-        html_parts.append("""
-                </div>
-            </div>
-        """)
+        html_parts.append(_STOCK_CARD_CLOSE)
     
     html_parts.append("</div>")
 
     return "".join(html_parts)
 
 
+# Shared LLMService instance (created on first use) and analyze_stock_news results
+# keyed by a hash of (ticker, headlines, price data)
+NEWS_ANALYSIS_CACHE_MAX_SIZE = 512
+_llm_service = None
+_news_analysis_cache = OrderedDict()
+_news_analysis_lock = threading.Lock()
+
+
+def _get_llm_service():
+    """Returns the module-wide LLMService, creating it on first use."""
+    global _llm_service
+    if _llm_service is None:
+        from .llm_service import LLMService
+        _llm_service = LLMService()
+    return _llm_service
+
+
+def analyze_stock_news_cached(llm_service, ticker: str, company_name: str, headlines: list, price_data: dict) -> dict:
+    """
+    Cached wrapper around LLMService.analyze_stock_news.
+    The same ticker with the same headlines and price (e.g. held by several users) is analyzed once.
+    Failed analyses are not cached.
+    """
+    payload = json.dumps([ticker, headlines, price_data], sort_keys=True, default=str)
+    key = hashlib.blake2b(payload.encode('utf-8'), digest_size=16).digest()
+
+    with _news_analysis_lock:
+        cached = _news_analysis_cache.get(key)
+        if cached is not None:
+            _news_analysis_cache.move_to_end(key)
+            return cached
+
+    analysis = llm_service.analyze_stock_news(
+        ticker=ticker,
+        company_name=company_name,
+        headlines=headlines,
+        price_data=price_data
+    )
+
+    if isinstance(analysis, dict) and not analysis.get('error'):
+        with _news_analysis_lock:
+            _news_analysis_cache[key] = analysis
+            if len(_news_analysis_cache) > NEWS_ANALYSIS_CACHE_MAX_SIZE:
+                _news_analysis_cache.popitem(last=False)
+    return analysis
+
+
 def get_portfolio_news_for_email(user_id: str, max_stocks: int = 3) -> list:
     """
     Get portfolio news for a user, using cache if available or generating if needed.
@@ -248,8 +650,6 @@ def get_portfolio_news_for_email(user_id: str, max_stocks: int = 3) -> list:
     Returns:
         List of stock dicts with news and analysis, sorted by interestingness
     """
-    import concurrent.futures
-
     # Check if user has holdings
     holdings_result = get_user_holdings(user_id)
     if 'error' in holdings_result:
@@ -279,8 +679,7 @@ def get_portfolio_news_for_email(user_id: str, max_stocks: int = 3) -> list:
 
     # Need to generate - fetch data for all tickers
     try:
-        from .llm_service import LLMService
-        llm_service = LLMService()
+        llm_service = _get_llm_service()
     except Exception as e:
         print(f"Email Service: Could not initialize LLM service: {e}")
         return []
@@ -306,14 +705,12 @@ def get_portfolio_news_for_email(user_id: str, max_stocks: int = 3) -> list:
                     "error": str(e)
                 })
 
-    # Analyze news for each stock with AI
-    analyzed_stocks = []
-
-    for stock in stock_data:
+    # Analyze news for each stock with AI (one LLM round-trip per ticker, run in parallel)
+    def analyze(stock):
         ticker = stock.get('ticker', '')
         company_name = stock.get('name', ticker)
         news = stock.get('news', [])
-        perf = stock.get('performance', {})
+        perf = stock.get('performance') or _EMPTY
 
         # Get top 3 headlines
         headlines = [n.get('title', '') for n in news[:3] if n.get('title')]
@@ -327,7 +724,8 @@ def get_portfolio_news_for_email(user_id: str, max_stocks: int = 3) -> list:
 
         # Analyze with AI
         try:
-            analysis = llm_service.analyze_stock_news(
+            analysis = analyze_stock_news_cached(
+                llm_service,
                 ticker=ticker,
                 company_name=company_name,
                 headlines=headlines,
@@ -337,7 +735,7 @@ def get_portfolio_news_for_email(user_id: str, max_stocks: int = 3) -> list:
             print(f"Email Service: Error analyzing {ticker}: {e}")
             analysis = {'summary': '', 'sentiment': 'neutral', 'key_themes': []}
 
-        analyzed_stocks.append({
+        return {
             "ticker": ticker,
             "company_name": company_name,
             "sector": stock.get('sector', 'Unknown'),
@@ -354,7 +752,10 @@ def get_portfolio_news_for_email(user_id: str, max_stocks: int = 3) -> list:
                 "notable_headline": analysis.get('notable_headline', '')
             },
             "error": stock.get('error') or analysis.get('error')
-        })
+        }
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
+        analyzed_stocks = list(executor.map(analyze, stock_data))
 
     # Save to cache
     news_data = {
@@ -367,6 +768,26 @@ def get_portfolio_news_for_email(user_id: str, max_stocks: int = 3) -> list:
     return get_top_interesting_stocks(analyzed_stocks, max_stocks)
 
 
+# Sentiment extremes score higher (0-5 points)
+_SENTIMENT_POINTS = {
+    'very_positive': 5, 'very_negative': 5,
+    'positive': 3, 'negative': 3,
+}
+
+
+def _interestingness_scores(news_counts, change_pcts, sentiment_points, has_summary):
+    """
+    Vectorized interestingness score for arrays of stock attributes:
+    news count (0-10) + absolute price change (0-10) + sentiment (0-5) + AI summary (2).
+    """
+    return (
+        np.minimum(news_counts * 2, 10)
+        + np.minimum(np.abs(change_pcts) * 2, 10)
+        + sentiment_points
+        + has_summary * 2.0
+    )
+
+
 def get_top_interesting_stocks(stocks: list, max_stocks: int = 3) -> list:
     """
     Sort stocks by "interestingness" and return the top N.
@@ -376,34 +797,35 @@ def get_top_interesting_stocks(stocks: list, max_stocks: int = 3) -> list:
     2. Absolute price change (bigger moves = more interesting)
     3. Sentiment extremes (very positive or very negative)
     """
-    def interestingness_score(stock):
-        score = 0
-
-        # News count (0-10 points)
-        news_count = stock.get('news_count', 0)
-        score += min(news_count * 2, 10)
-
-        # Absolute price change (0-10 points)
-        change_pct = abs(stock.get('change_percent', 0) or 0)
-        score += min(change_pct * 2, 10)
+    if not stocks or max_stocks <= 0:
+        return []
 
-        # Sentiment extremes (0-5 points)
-        sentiment = stock.get('analysis', {}).get('sentiment', 'neutral')
-        if sentiment in ['very_positive', 'very_negative']:
-            score += 5
-        elif sentiment in ['positive', 'negative']:
-            score += 3
+    # Extract the scoring inputs once into flat arrays, then score them in a single vectorized pass
+    n = len(stocks)
+    news_counts = np.fromiter((s.get('news_count', 0) or 0 for s in stocks), dtype=np.float64, count=n)
+    change_pcts = np.fromiter((s.get('change_percent', 0) or 0 for s in stocks), dtype=np.float64, count=n)
+    sentiment_points = np.empty(n, dtype=np.float64)
+    has_summary = np.empty(n, dtype=bool)
+    for i, s in enumerate(stocks):
+        analysis = s.get('analysis') or _EMPTY
+        sentiment_points[i] = _SENTIMENT_POINTS.get(analysis.get('sentiment', 'neutral'), 0)
+        has_summary[i] = bool(analysis.get('summary'))
 
-        # Has AI summary (2 points)
-        if stock.get('analysis', {}).get('summary'):
-            score += 2
+    scores = _interestingness_scores(news_counts, change_pcts, sentiment_points, has_summary)
 
-        return score
+    if len(stocks) > max_stocks:
+        # Partition to find the N-th best score; ties at the cutoff keep input order (like a stable sort)
+        kth = np.partition(scores, len(stocks) - max_stocks)[len(stocks) - max_stocks]
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)[:max_stocks - len(above)]
+        idx = np.concatenate((above, ties))
+    else:
+        idx = np.arange(len(stocks))
 
-    # Sort by interestingness score descending
-    sorted_stocks = sorted(stocks, key=interestingness_score, reverse=True)
+    # Order the (small) selection by score descending, input order on ties
+    idx = idx[np.lexsort((idx, -scores[idx]))]
 
-    return sorted_stocks[:max_stocks]
+    return [stocks[i] for i in idx]
 
 
 def generate_portfolio_news_html(user_id: str, preferences: list) -> str:
@@ -421,16 +843,7 @@ def generate_portfolio_news_html(user_id: str, preferences: list) -> str:
     if not stocks:
         return ""
 
-    html_parts = []
-    html_parts.append("""
-        <div style="margin: 24px 0; border-top: 2px solid #e5e7eb; padding-top: 24px;">
-            <h3 style="margin: 0 0 16px 0; color: #111827; font-size: 20px;">
-                📈 Portfolio Highlights
-            </h3>
-            <p style="font-size: 12px; color: #6b7280; margin-bottom: 16px;">
-                Top movers and news from your portfolio
-            </p>
-    """)
+    html_parts = [_PORTFOLIO_HEADER]
 
     for stock in stocks:
         ticker = stock.get('ticker', '')
@@ -438,83 +851,37 @@ def generate_portfolio_news_html(user_id: str, preferences: list) -> str:
         price = stock.get('price')
         change_pct = stock.get('change_percent')
         headlines = stock.get('headlines', [])
-        analysis = stock.get('analysis', {})
+        analysis = stock.get('analysis') or _EMPTY
 
         # Determine color based on performance
-        if change_pct is not None:
-            if change_pct > 0:
-                perf_color = "#059669"  # Green
-                perf_bg = "#d1fae5"
-                arrow = "▲"
-            elif change_pct < 0:
-                perf_color = "#dc2626"  # Red
-                perf_bg = "#fee2e2"
-                arrow = "▼"
-            else:
-                perf_color = "#6b7280"  # Gray
-                perf_bg = "#f3f4f6"
-                arrow = "–"
-            perf_text = f"{arrow} {'+' if change_pct > 0 else ''}{change_pct:.2f}%"
-        else:
-            perf_color = "#6b7280"
-            perf_bg = "#f3f4f6"
-            perf_text = "N/A"
+        perf_color, perf_bg, perf_text = _change_style(change_pct)
 
         price_text = f"${price:.2f}" if price else "N/A"
 
         # Sentiment badge
         sentiment = analysis.get('sentiment', 'neutral')
-        sentiment_colors = {
-            'very_positive': ('#065f46', '#d1fae5', '🚀'),
-            'positive': ('#059669', '#d1fae5', '📈'),
-            'neutral': ('#6b7280', '#f3f4f6', '➡️'),
-            'negative': ('#dc2626', '#fee2e2', '📉'),
-            'very_negative': ('#991b1b', '#fee2e2', '⚠️')
-        }
-        sent_color, sent_bg, sent_emoji = sentiment_colors.get(sentiment, sentiment_colors['neutral'])
+        sent_color, sent_bg, sent_emoji = _SENTIMENT_STYLES.get(sentiment, _SENTIMENT_STYLES['neutral'])
 
-        html_parts.append(f"""
-            <div style="border: 1px solid #e5e7eb; border-radius: 8px; margin-bottom: 12px; overflow: hidden;">
-                <div style="padding: 12px 16px; display: flex; justify-content: space-between; align-items: center; background-color: #f8fafc; border-bottom: 1px solid #e5e7eb;">
-                    <div>
-                        <span style="font-weight: 700; color: #111827; font-size: 16px;">{ticker}</span>
-                        <span style="color: #6b7280; font-size: 13px; margin-left: 8px;">{company_name}</span>
-                    </div>
-                    <div style="text-align: right;">
-                        <span style="font-weight: 600; color: #374151; font-size: 15px;">{price_text}</span>
-                        <span style="margin-left: 8px; padding: 4px 8px; border-radius: 4px; font-weight: 600; font-size: 13px; background-color: {perf_bg}; color: {perf_color};">
-                            {perf_text}
-                        </span>
-                    </div>
-                </div>
-                <div style="padding: 12px 16px;">
-        """)
+        html_parts.append(_STOCK_CARD_TEMPLATE.format(
+            ticker=escape(ticker), name=escape(company_name), price_text=price_text,
+            perf_bg=perf_bg, perf_color=perf_color, perf_text=perf_text
+        ))
 
         # AI Summary
         summary = analysis.get('summary', '')
         if summary:
-            html_parts.append(f"""
-                    <div style="margin-bottom: 12px; padding: 10px; background-color: #f9fafb; border-radius: 6px; border-left: 3px solid {sent_color};">
-                        <div style="font-size: 12px; color: #6b7280; margin-bottom: 4px;">{sent_emoji} AI Analysis</div>
-                        <p style="margin: 0; font-size: 13px; color: #374151; line-height: 1.5;">{summary}</p>
-                    </div>
-            """)
+            html_parts.append(_AI_SUMMARY_TEMPLATE.format(
+                sent_color=sent_color, sent_emoji=sent_emoji, summary=escape(summary)
+            ))
 
         # Headlines
         if headlines:
-            html_parts.append("""
-                    <div style="font-size: 12px; color: #6b7280; text-transform: uppercase; letter-spacing: 0.5px; margin-bottom: 6px;">Recent Headlines</div>
-                    <ul style="margin: 0; padding-left: 16px; color: #374151; font-size: 13px;">
-            """)
+            html_parts.append(_PORTFOLIO_HEADLINES_HEADER)
             for h in headlines[:2]:  # Show max 2 headlines in email
-                headline = h[:80] + "..." if len(h) > 80 else h
-                html_parts.append(f'<li style="margin-bottom: 4px;">{headline}</li>')
+                html_parts.append(_HEADLINE_ITEM_TEMPLATE.format(headline=escape(_truncate(h, 80))))
             html_parts.append("</ul>")
 
-        html_parts.append("""
-                </div>
-            </div>
-        """)
+        html_parts.append(_STOCK_CARD_CLOSE)
 
     html_parts.append("</div>")
 
@@ -562,18 +929,44 @@ def filter_email_data_by_preferences(data: dict, preferences: list) -> dict:
     return filtered
 
 
-def send_daily_email_task():
+def _content_hash(data) -> str:
+    """Stable blake2b hash of a JSON-serializable payload."""
+    payload = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _send_key(recipient_email: str, content_hash: str) -> str:
+    """Identifies 'this content was sent to this recipient' in the send log."""
+    return hashlib.blake2b(f"{recipient_email}\n{content_hash}".encode('utf-8'), digest_size=16).hexdigest()
+
+
+@functools.lru_cache(maxsize=4)
+def _load_daily_analysis(path: str, mtime_ns: int, size: int) -> dict:
+    """
+    Parses daily_analysis.json. Keyed on (path, mtime, size) so an unchanged file
+    is only parsed once; the returned dict is shared and must not be mutated.
+    """
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def send_daily_email_task(force: bool = False):
+    """
+    Sends the daily analysis email to every subscribed/legacy recipient.
+    Recipients who already received identical (preference-filtered) content in the
+    last 24 hours are skipped unless force=True.
+    """
     print("Email Service: Starting daily email task...")
 
     # 1. Load Daily Analysis (full data - filtering happens per-user)
-    cache_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'daily_analysis.json')
+    cache_file = DAILY_ANALYSIS_FILE
     if not os.path.exists(cache_file):
         print("Email Service: No daily analysis file found. Aborting.")
         return
 
     try:
-        with open(cache_file, 'r') as f:
-            full_data = json.load(f)
+        st = os.stat(cache_file)
+        full_data = _load_daily_analysis(cache_file, st.st_mtime_ns, st.st_size)
     except Exception as e:
         print(f"Email Service: Failed to read analysis file: {e}")
         return
@@ -595,10 +988,12 @@ def send_daily_email_task():
     legacy_recipients = os.environ.get("EMAIL_RECIPIENT", "")
     legacy_emails = [r.strip() for r in legacy_recipients.split(',') if r.strip()]
 
-    # Combine user service emails with legacy emails (dedup)
-    all_emails = set(u['email'] for u in subscribed_users)
-    all_emails.update(legacy_emails)
-    recipients = list(all_emails)
+    # Combine user service emails with legacy emails (dedup, insertion-ordered)
+    # Each recipient maps to its user record, or None for legacy-only addresses
+    user_map = {u['email']: u for u in subscribed_users}
+    for email in legacy_emails:
+        user_map.setdefault(email, None)
+    recipients = list(user_map.items())
 
     if not recipients:
         print("Email Service: No valid recipients found. Add users via the API or set EMAIL_RECIPIENT env var.")
@@ -606,309 +1001,375 @@ def send_daily_email_task():
 
     print(f"Email Service: Found {len(recipients)} recipients for content type '{CONTENT_TYPE_ID}'")
 
+    # Filter data per distinct preference set (shared by recipients with the same prefs)
+    # If no preferences, show everything (backwards compatibility for legacy recipients)
+    filtered_by_prefs = {}  # sorted preferences tuple -> (filtered data, content hash)
+
+    def filtered_for(user_preferences):
+        prefs_key = tuple(sorted(user_preferences))
+        entry = filtered_by_prefs.get(prefs_key)
+        if entry is None:
+            filtered_data = filter_email_data_by_preferences(full_data, user_preferences) if user_preferences else full_data
+            entry = (filtered_data, _content_hash(filtered_data))
+            filtered_by_prefs[prefs_key] = entry
+        return entry
+
+    # Skip recipients that already got this exact content (retries, scheduler double-fires)
+    send_keys = {}
+    today = datetime.now().date().isoformat()
+    for recipient_email, user_data in recipients:
+        user_preferences = user_data.get('preferences', []) if user_data else []
+        _, content_hash = filtered_for(user_preferences)
+        if PERSONALIZED_CONTENT_TYPES.intersection(user_preferences):
+            # Watchlist / portfolio news isn't in the hash; keying on the date still
+            # dedups same-day re-sends without holding back the next day's news
+            content_hash = f"{content_hash}\n{today}"
+        send_keys[recipient_email] = _send_key(recipient_email, content_hash)
+
+    if not force:
+        try:
+            already_sent = get_recently_sent_keys(list(send_keys.values()))
+        except Exception as e:
+            print(f"Email Service: Could not read send log: {e}")
+            already_sent = set()
+        if already_sent:
+            recipients = [(email, u) for email, u in recipients if send_keys[email] not in already_sent]
+            print(f"Email Service: Skipping {len(already_sent)} recipients that already received this content.")
+            if not recipients:
+                return {"status": "success", "message": "Sent 0 emails (all recipients already up to date)"}
+
     # 3. Common email data
     date_str = datetime.now().strftime("%B %d, %Y")
     score = full_data.get('intrigue_score', 0)
 
     # Pre-generate chart images for all questions (will only be included if user has quantitative_analysis pref)
+    # Recipients without preferences (e.g. legacy) get everything, so they need charts too
+    needs_charts = any(
+        not user_data or not user_data.get('preferences')
+        or 'quantitative_analysis' in user_data['preferences']
+        for _, user_data in recipients
+    )
     questions = full_data.get('questions', [])
-    images_to_attach = []
+    images_to_attach = generate_question_charts(questions) if needs_charts else []
+    if not needs_charts:
+        print("Email Service: No recipient receives quantitative analysis, skipping chart generation.")
+
+    # 4. Build personalized emails for each user
+    # Recipients whose email can't contain per-user sections (watchlist / portfolio) and who share
+    # the same preferences get byte-identical content: build it once and send a single multi-RCPT message.
+    image_parts = build_image_parts(images_to_attach)
+    groups = {}  # group_key -> [recipient_emails, msg, prefs_str]
+    question_sections = {}  # sorted preferences tuple -> render_question_cards() result
+
+    for recipient_email, user_data in recipients:
+        user_preferences = user_data.get('preferences', []) if user_data else []
+
+        if PERSONALIZED_CONTENT_TYPES.intersection(user_preferences):
+            group_key = ('user', recipient_email)
+        else:
+            group_key = ('prefs',) + tuple(sorted(user_preferences))
 
-    for i, q in enumerate(questions):
-        if 'results' in q and isinstance(q['results'], dict):
-            stats_data = q['results'].get('results', {})
-            control_data = q['results'].get('control', {})
-            chart_img_data = generate_chart_image(stats_data, control_data)
-            if chart_img_data:
-                images_to_attach.append((f"chart_{i}", chart_img_data))
-
-    # 4. Send personalized emails to each user
+        if group_key in groups:
+            groups[group_key][0].append(recipient_email)
+            continue
+
+        filtered_data, _ = filtered_for(user_preferences)
+
+        # Build personalized HTML for this user
+        try:
+            # Question cards depend only on the filtered data: render once per preference set
+            prefs_key = tuple(sorted(user_preferences))
+            questions_section = question_sections.get(prefs_key)
+            if questions_section is None:
+                questions_section = render_question_cards(filtered_data.get('questions', []), images_to_attach)
+                question_sections[prefs_key] = questions_section
+
+            full_html, user_images = build_email_html_for_user(
+                filtered_data,
+                date_str,
+                score,
+                user_data,
+                images_to_attach,
+                user_preferences,
+                questions_section=questions_section
+            )
+            msg = build_email_message(full_html, user_images, date_str, score, sender_email, recipient_email,
+                                      image_parts=image_parts)
+        except Exception as e:
+            print(f"Email Service: Failed to build email for {recipient_email}: {e}")
+            continue
+
+        prefs_str = ', '.join(user_preferences) if user_preferences else 'all (default)'
+        groups[group_key] = [[recipient_email], msg, prefs_str]
+
+    outgoing = []
+    for group_emails, msg, prefs_str in groups.values():
+        if len(group_emails) > 1:
+            # Shared message: don't expose the other recipients' addresses
+            del msg['To']
+            msg['To'] = 'undisclosed-recipients:;'
+        outgoing.append((group_emails, msg, prefs_str))
+
+    # 5. Send over a small pool of SMTP connections
+    print("Email Service: Connecting to SMTP server...")
+    sent_emails, errors = send_email_messages(outgoing, smtp_server, smtp_port, sender_email, sender_password)
+    emails_sent = len(sent_emails)
+
+    log_result = record_sent_emails([send_keys[email] for email in sent_emails])
+    if "error" in log_result:
+        print(f"Email Service: Could not update send log: {log_result['error']}")
+
+    if errors and emails_sent == 0:
+        print(f"Email Service: Failed to send email: {errors[0]}")
+        return {"error": errors[0]}
+
+    print(f"Email Service: Successfully sent {emails_sent} emails.")
+    return {"status": "success", "message": f"Sent {emails_sent} emails"}
+
+
+def build_image_parts(images: list) -> dict:
+    """
+    Encodes each (cid, png_bytes) image into an inline MIMEImage part once.
+    The parts are identical for every recipient, so they are shared across messages
+    instead of re-running the base64 encode per user.
+    """
+    parts = {}
+    for cid, img_data in images:
+        # Explicit subtype skips MIMEImage's image-format sniffing
+        img = MIMEImage(img_data, 'png')
+        img.add_header('Content-ID', f'<{cid}>')
+        img.add_header('Content-Disposition', 'inline', filename=f'{cid}.png')
+        parts[cid] = img
+    return parts
+
+
+def build_email_message(full_html: str, images: list, date_str: str, score: int, sender_email: str, recipient_email: str,
+                        image_parts: dict = None) -> MIMEMultipart:
+    """
+    Builds the MIME message (HTML body + inline chart images) for one recipient.
+    Pre-encoded parts from build_image_parts are reused when provided.
+    """
+    msg = MIMEMultipart('related')
+    msg['Subject'] = f"Daily Market Insights: {date_str} (Score: {score})"
+    msg['From'] = sender_email
+    msg['To'] = recipient_email
+
+    # Attach HTML
+    msg_alternative = MIMEMultipart('alternative')
+    msg.attach(msg_alternative)
+    msg_alternative.attach(MIMEText(full_html, 'html'))
+
+    # Attach Images with Content-IDs (only those used in this user's email)
+    if image_parts is None:
+        image_parts = {}
+    for cid, img_data in images:
+        img = image_parts.get(cid)
+        if img is None:
+            img = build_image_parts([(cid, img_data)])[cid]
+        msg.attach(img)
+
+    return msg
+
+
+# Parallel SMTP connections used by send_email_messages (Gmail throttles per connection)
+SMTP_MAX_CONNECTIONS = int(os.environ.get("SMTP_MAX_CONNECTIONS", 4))
+
+
+def _send_email_batch(batch: list, smtp_server: str, smtp_port: int, sender_email: str, sender_password: str) -> tuple:
+    """Sends a batch of (recipient_emails, msg, prefs_str) over one SMTP connection."""
+    sent = []
+    errors = []
     try:
-        print("Email Service: Connecting to SMTP server...")
         with smtplib.SMTP(smtp_server, smtp_port) as server:
             server.starttls()
             server.login(sender_email, sender_password)
 
-            emails_sent = 0
-
-            # Create a map of emails to user data for personalization
-            user_map = {u['email']: u for u in subscribed_users}
-
-            for recipient_email in recipients:
-                # Get user data if available
-                user_data = user_map.get(recipient_email)
-                user_preferences = user_data.get('preferences', []) if user_data else []
-
-                # Filter data based on user preferences
-                # If no preferences, show everything (backwards compatibility for legacy recipients)
-                filtered_data = filter_email_data_by_preferences(full_data, user_preferences) if user_preferences else full_data
-
-                # Build personalized HTML for this user
-                full_html, user_images = build_email_html_for_user(
-                    filtered_data,
-                    date_str,
-                    score,
-                    user_data,
-                    images_to_attach,
-                    user_preferences
-                )
-
-                # Build Message
-                msg = MIMEMultipart('related')
-                msg['Subject'] = f"Daily Market Insights: {date_str} (Score: {score})"
-                msg['From'] = sender_email
-                msg['To'] = recipient_email
-
-                # Attach HTML
-                msg_alternative = MIMEMultipart('alternative')
-                msg.attach(msg_alternative)
-                msg_alternative.attach(MIMEText(full_html, 'html'))
-
-                # Attach Images with Content-IDs (only those used in this user's email)
-                for cid, img_data in user_images:
-                    img = MIMEImage(img_data)
-                    img.add_header('Content-ID', f'<{cid}>')
-                    img.add_header('Content-Disposition', 'inline', filename=f'{cid}.png')
-                    msg.attach(img)
-
-                # Send to this recipient
-                server.send_message(msg)
-                emails_sent += 1
-
-                prefs_str = ', '.join(user_preferences) if user_preferences else 'all (default)'
-                print(f"Email Service: Sent personalized email to {recipient_email} (prefs: {prefs_str})")
-
-            print(f"Email Service: Successfully sent {emails_sent} emails.")
-            return {"status": "success", "message": f"Sent {emails_sent} emails"}
-
+            for recipient_emails, msg, prefs_str in batch:
+                try:
+                    refused = server.send_message(msg, to_addrs=recipient_emails)
+                    for recipient_email in recipient_emails:
+                        if recipient_email in refused:
+                            print(f"Email Service: Recipient refused {recipient_email}: {refused[recipient_email]}")
+                            errors.append(f"{recipient_email}: {refused[recipient_email]}")
+                        else:
+                            sent.append(recipient_email)
+                            print(f"Email Service: Sent personalized email to {recipient_email} (prefs: {prefs_str})")
+                except smtplib.SMTPServerDisconnected:
+                    raise
+                except Exception as e:
+                    print(f"Email Service: Failed to send to {', '.join(recipient_emails)}: {e}")
+                    errors.append(str(e))
     except Exception as e:
-        print(f"Email Service: Failed to send email: {e}")
-        return {"error": str(e)}
+        print(f"Email Service: SMTP connection error: {e}")
+        errors.append(str(e))
+    return sent, errors
+
+
+def send_email_messages(outgoing: list, smtp_server: str, smtp_port: int, sender_email: str, sender_password: str,
+                        max_connections: int = None) -> tuple:
+    """
+    Sends (recipient_emails, msg, prefs_str) tuples concurrently over up to
+    max_connections SMTP connections, so N sends cost ~N/K round-trips instead of N.
+    Each message is delivered with one MAIL FROM/DATA to all of its recipient_emails.
+
+    Returns: (list_of_sent_recipient_emails, list_of_error_strings)
+    """
+    if not outgoing:
+        return [], []
+
+    max_connections = max(1, min(max_connections or SMTP_MAX_CONNECTIONS, len(outgoing)))
+    # Round-robin split so each connection gets a similar share
+    batches = [outgoing[i::max_connections] for i in range(max_connections)]
+
+    sent_emails = []
+    errors = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_connections) as executor:
+        futures = [
+            executor.submit(_send_email_batch, batch, smtp_server, smtp_port, sender_email, sender_password)
+            for batch in batches
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            sent, batch_errors = future.result()
+            sent_emails.extend(sent)
+            errors.extend(batch_errors)
+
+    return sent_emails, errors
+
+
+# Header (background, blurb) by intrigue score tier
+_HEADER_HIGH = ("#065f46", "Market conditions today are statistically highly significant, suggesting strong potential for future price action.")  # Green
+_HEADER_MODERATE = ("#1e40af", "Today shows some moderate historical patterns that may offer actionable insights.")
+_HEADER_DEFAULT = ("#1e40af", "Today's market conditions show interesting patterns worth monitoring.")  # Blue
+_HEADER_LOW = ("#4b5563", "Today's market activity was largely noise with few statistically significant historical parallels.")  # Gray
+
+# Stats table signal-mean colors
+_SIGNAL_UP_COLOR = "#059669"
+_SIGNAL_DOWN_COLOR = "#dc2626"
+
+def render_question_cards(questions: list, all_images: list) -> tuple:
+    """
+    Renders the Key Insights section (question cards, charts, stats tables).
+    The section only depends on the (filtered) questions, so the send task renders it
+    once per preference set and shares it across recipients.
+
+    Returns: (html Markup or None, list_of_images_to_attach)
+    """
+    if not questions:
+        return None, []
+
+    used_images = []
+    question_cards = []
+    images_by_cid = dict(all_images)
+    for i, q in enumerate(questions):
+        stats_data = _EMPTY
+        control_data = _EMPTY
+        has_results = False
+
+        q_results = q.get('results')
+        if isinstance(q_results, dict):
+            stats_data = q_results.get('results') or _EMPTY
+            control_data = q_results.get('control') or _EMPTY
+            has_results = True
+
+        # Check if we have a chart image for this question
+        chart_cid = f"chart_{i}"
+        chart_img_data = images_by_cid.get(chart_cid)
+        if chart_img_data is not None:
+            used_images.append((chart_cid, chart_img_data))
+
+        # Stats Table rows: (period, signal mean, baseline, win rate, signal color)
+        stats_rows = None
+        if has_results:
+            periods = _ordered_periods(stats_data)
+
+            s_means = [stats_data[p]['mean'] for p in periods]
+            b_means = [control_data[p]['mean'] if p in control_data and isinstance(control_data[p], dict) else 0 for p in periods]
+            win_rates = [stats_data[p]['win_rate'] for p in periods]
+            colors = np.where(np.asarray(s_means, dtype=np.float64) > 0, _SIGNAL_UP_COLOR, _SIGNAL_DOWN_COLOR)
+            stats_rows = list(zip(
+                periods, format_percentages(s_means), format_percentages(b_means), format_percentages(win_rates), colors.tolist()
+            ))
+
+        question_cards.append({
+            'question': q.get('question', 'Unknown Question'),
+            'insight': q.get('insight_explanation', ''),
+            'verdict': q.get('result_explanation', ''),
+            'count': stats_data.get('count', 0),
+            'chart_cid': chart_cid if chart_img_data else None,
+            'stats_rows': stats_rows,
+        })
+
+    return Markup(QUESTION_CARDS_TEMPLATE.render(questions=question_cards)), used_images
 
 
-def build_email_html_for_user(data: dict, date_str: str, score: int, user_data: dict, all_images: list, preferences: list) -> tuple:
+def build_email_html_for_user(data: dict, date_str: str, score: int, user_data: dict, all_images: list, preferences: list,
+                              questions_section: tuple = None) -> tuple:
     """
     Build personalized HTML email content based on user preferences.
+    questions_section: optional pre-rendered render_question_cards() result for data['questions'].
 
     Returns: (html_string, list_of_images_to_attach)
     """
-    html_parts = []
-    used_images = []
 
     # Header Color Logic
-    header_bg = "#1e40af"  # Blue default
-    score_text = "Today's market conditions show interesting patterns worth monitoring."
     if score >= 80:
-        header_bg = "#065f46"  # Green
-        score_text = "Market conditions today are statistically highly significant, suggesting strong potential for future price action."
+        header_bg, score_text = _HEADER_HIGH
     elif score < 50:
-        header_bg = "#4b5563"  # Gray
-        score_text = "Today's market activity was largely noise with few statistically significant historical parallels."
+        header_bg, score_text = _HEADER_LOW
     elif score >= 60:
-        score_text = "Today shows some moderate historical patterns that may offer actionable insights."
-
-    # Start HTML
-    html_parts.append(f"""
-    <html>
-    <body style="font-family: 'Helvetica Neue', Helvetica, Arial, sans-serif; color: #1f2937; background-color: #f3f4f6; margin: 0; padding: 20px;">
-        <div style="max-width: 600px; margin: 0 auto; background-color: white; border-radius: 12px; overflow: hidden; box-shadow: 0 4px 6px -1px rgba(0, 0, 0, 0.1);">
-            <!-- Header -->
-            <div style="background-color: {header_bg}; color: white; padding: 24px; text-align: center;">
-                <div style="font-size: 12px; text-transform: uppercase; letter-spacing: 1px; opacity: 0.8;">Daily Market Analysis</div>
-                <h1 style="margin: 8px 0; font-size: 28px; font-weight: 700;">{date_str}</h1>
-                <div style="margin-top: 16px; display: inline-block; background-color: rgba(255,255,255,0.2); padding: 6px 16px; border-radius: 20px; font-weight: 600;">
-                    Intrigue Score: {score}/100
-                </div>
-                <div style="margin-top: 8px; font-size: 13px; opacity: 0.9; font-style: italic;">
-                    {score_text}
-                </div>
-            </div>
-    """)
-
-    # Summary section (market_overview preference)
-    if data.get('summary'):
-        html_parts.append(f"""
-            <!-- Summary -->
-            <div style="padding: 24px;">
-                <p style="font-size: 16px; line-height: 1.6; margin-top: 0;">{data.get('summary')}</p>
-            </div>
-        """)
-
-    # Headlines section (headlines preference)
-    if data.get('top_news'):
-        html_parts.append(f"""
-            <!-- Headlines -->
-            <div style="background-color: #f9fafb; padding: 24px; border-top: 1px solid #e5e7eb; border-bottom: 1px solid #e5e7eb;">
-                <h3 style="margin: 0 0 16px 0; color: #4b5563; font-size: 14px; text-transform: uppercase; letter-spacing: 0.5px;">Top Headlines</h3>
-                <ul style="margin: 0; padding-left: 20px; color: #374151;">
-                    {''.join(f'<li style="margin-bottom: 8px;">{h}</li>' for h in data.get('top_news', []))}
-                </ul>
-            </div>
-        """)
+        header_bg, score_text = _HEADER_MODERATE
+    else:
+        header_bg, score_text = _HEADER_DEFAULT
 
     # Questions & Analysis section (quantitative_analysis preference)
     questions = data.get('questions', [])
-    if questions:
-        html_parts.append("""
-            <!-- Questions & Analysis -->
-            <div style="padding: 24px;">
-                <h3 style="margin: 0 0 20px 0; color: #111827; font-size: 20px;">Key Insights</h3>
-        """)
-
-        for i, q in enumerate(questions):
-            q_text = q.get('question', 'Unknown Question')
-            insight = q.get('insight_explanation', '')
-            result_explanation = q.get('result_explanation', '')
-
-            stats_data = {}
-            control_data = {}
-            has_results = False
-
-            if 'results' in q and isinstance(q['results'], dict):
-                stats_data = q['results'].get('results', {})
-                control_data = q['results'].get('control', {})
-                has_results = True
-
-            count = stats_data.get('count', 0)
-
-            # Check if we have a chart image for this question
-            chart_cid = f"chart_{i}"
-            chart_img_data = None
-            for cid, img_data in all_images:
-                if cid == chart_cid:
-                    chart_img_data = img_data
-                    used_images.append((cid, img_data))
-                    break
-
-            # HTML for this Question Card
-            html_parts.append(f"""
-            <div style="border: 1px solid #e5e7eb; border-radius: 8px; margin-bottom: 24px; overflow: hidden;">
-                <div style="background-color: #f8fafc; padding: 16px; border-bottom: 1px solid #e5e7eb;">
-                    <h4 style="margin: 0; color: #1e40af; font-size: 16px;">{q_text}</h4>
-                    <div style="font-size: 12px; color: #64748b; margin-top: 4px;">Based on {count} historical occurrences</div>
-                </div>
-
-                <div style="padding: 16px;">
-                    <!-- Insight -->
-                    <div style="margin-bottom: 16px; font-size: 14px; color: #4b5563; font-style: italic; border-left: 3px solid #3b82f6; padding-left: 12px;">
-                        "{insight}"
-                    </div>
-
-                    <!-- Result Interpretation -->
-                    <div style="margin-bottom: 16px; font-size: 14px; color: #1f2937;">
-                        <strong>Verdict:</strong> {result_explanation}
-                    </div>
-            """)
-
-            # Add Chart if available
-            if chart_img_data:
-                html_parts.append(f"""
-                    <div style="text-align: center; margin: 20px 0;">
-                        <img src="cid:{chart_cid}" style="max-width: 100%; height: auto; border-radius: 4px; border: 1px solid #e5e7eb;" alt="Performance Chart">
-                    </div>
-                """)
-
-            # Stats Table
-            if has_results:
-                periods = [k for k in stats_data.keys() if k != 'count' and k in stats_data and isinstance(stats_data[k], dict)]
-                order = ['1W', '1M', '3M', '6M', '1Y', '3Y', '5Y', '10Y']
-                periods = sorted(periods, key=lambda x: order.index(x) if x in order else 999)
-
-                html_parts.append("""
-                    <table style="width: 100%; border-collapse: collapse; font-size: 13px; margin-top: 12px;">
-                        <tr style="background-color: #f3f4f6; color: #4b5563;">
-                            <th style="padding: 8px; text-align: left;">Period</th>
-                            <th style="padding: 8px; text-align: right;">Signal Mean</th>
-                            <th style="padding: 8px; text-align: right;">Baseline</th>
-                            <th style="padding: 8px; text-align: right;">Win Rate</th>
-                        </tr>
-                """)
-
-                for p in periods:
-                    s_mean = stats_data[p]['mean']
-                    b_mean = control_data[p]['mean'] if p in control_data and isinstance(control_data[p], dict) else 0
-                    win_rate = stats_data[p]['win_rate']
-                    color = "#059669" if s_mean > 0 else "#dc2626"
-
-                    html_parts.append(f"""
-                        <tr style="border-bottom: 1px solid #f3f4f6;">
-                            <td style="padding: 8px; font-weight: 600; color: #374151;">{p}</td>
-                            <td style="padding: 8px; text-align: right; font-weight: 700; color: {color};">{format_percentage(s_mean)}</td>
-                            <td style="padding: 8px; text-align: right; color: #6b7280;">{format_percentage(b_mean)}</td>
-                            <td style="padding: 8px; text-align: right; color: #374151;">{format_percentage(win_rate)}</td>
-                        </tr>
-                    """)
-
-                html_parts.append("</table>")
-
-            html_parts.append("""
-                </div>
-            </div>
-            """)
-
-        html_parts.append("</div>")  # Close Questions & Analysis section
+    if questions_section is None:
+        questions_section = render_question_cards(questions, all_images)
+    questions_html, used_images = questions_section
 
     # Watchlist section (watchlist_news preference)
+    watchlist_html = None
     if user_data:
         try:
             watchlist_html = generate_watchlist_html(user_data)
-            if watchlist_html:
-                html_parts.append(watchlist_html)
         except Exception as e:
             print(f"Email Service: Error generating watchlist: {e}")
 
     # Portfolio news section (portfolio_news preference)
+    portfolio_news_html = None
     if user_data and user_data.get('id'):
         try:
             portfolio_news_html = generate_portfolio_news_html(user_data['id'], preferences)
-            if portfolio_news_html:
-                html_parts.append(portfolio_news_html)
         except Exception as e:
             print(f"Email Service: Error generating portfolio news: {e}")
 
     # Glossary Section - gather terms used in the filtered content
-    all_text = (
-        data.get('summary', '') + " " +
-        " ".join(data.get('top_news', [])) + " " +
-        " ".join([q.get('question', '') + " " + q.get('insight_explanation', '') + " " + q.get('result_explanation', '') for q in questions])
-    ).lower()
-
-    used_terms = []
-    for term, definition in GLOSSARY.items():
-        if term.lower() in all_text:
-            used_terms.append((term, definition))
-
-    if used_terms:
-        html_parts.append("""
-            <div style="padding: 24px; border-top: 1px solid #e5e7eb;">
-                <h3 style="margin: 0 0 16px 0; color: #4b5563; font-size: 14px; text-transform: uppercase; letter-spacing: 0.5px;">Glossary of Terms</h3>
-                <div style="font-size: 13px; color: #4b5563;">
-        """)
-
-        for term, definition in used_terms:
-            html_parts.append(f"""
-                <div style="margin-bottom: 12px;">
-                    <strong style="color: #1f2937;">{term}:</strong> {definition}
-                </div>
-            """)
-
-        html_parts.append("""
-                </div>
-            </div>
-        """)
-
-    # Footer HTML
-    html_parts.append("""
-            </div>
-            <div style="background-color: #f9fafb; padding: 20px; text-align: center; color: #9ca3af; font-size: 12px; border-top: 1px solid #e5e7eb;">
-                Automated Daily Market Analysis System
-            </div>
-        </div>
-    </body>
-    </html>
-    """)
-
-    return "".join(html_parts), used_images
+    all_text = " ".join(itertools.chain(
+        (data.get('summary', ''),),
+        data.get('top_news', []),
+        itertools.chain.from_iterable(
+            (q.get('question', ''), q.get('insight_explanation', ''), q.get('result_explanation', ''))
+            for q in questions
+        )
+    )).lower()
+
+    used_terms = find_glossary_terms(all_text)
+
+    html = DAILY_EMAIL_TEMPLATE.render(
+        header_bg=header_bg,
+        score_text=score_text,
+        date_str=date_str,
+        score=score,
+        summary=data.get('summary'),
+        top_news=data.get('top_news'),
+        questions_html=questions_html,
+        # Section builders escape every interpolated value (see _STOCK_CARD_TEMPLATE)
+        watchlist_html=Markup(watchlist_html) if watchlist_html else None,
+        portfolio_news_html=Markup(portfolio_news_html) if portfolio_news_html else None,
+        used_terms=used_terms,
+    )
+
+    return html, used_images
 
 if __name__ == "__main__":
     # Quick test if run directly
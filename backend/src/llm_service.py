@@ -1,35 +1,503 @@
 from google import genai
+from google.genai import types
+from google.genai import errors as genai_errors
+import httpx
+import tenacity
 import os
+import re
 import textwrap
 import json
+import logging
+import concurrent.futures
+import threading
+import hashlib
+import functools
+import time
+import sqlite3
+from datetime import datetime
+from collections import OrderedDict
+from typing import Literal, Optional
+from pydantic import BaseModel
 
-class LLMService:
-    def __init__(self):
-        api_key = os.environ.get("GOOGLE_API_KEY")
-        if not api_key:
-            print("Warning: GOOGLE_API_KEY not found in environment variables.")
-        else:
-            self.client = genai.Client(api_key=api_key)
-            self.model_name = 'gemini-2.5-pro'
+logger = logging.getLogger(__name__)
 
-    def generate_backtest_condition(self, query: str) -> dict:
-        """
-        Generates a Python function string and extracted periods from a natural language query.
-        Returns a dict: {'code': str, 'periods': list[str] or None}
-        """
-        if not self.client:
-            return {"code": "", "periods": None}
+# orjson decodes model replies several times faster; it's optional, stdlib json is the fallback.
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so existing except clauses still match.
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# JSON mode returns bare JSON, but a reply that still arrives wrapped in a markdown fence
+# shouldn't cost a whole failed request
+_MD_FENCE_RE = re.compile(r'\A\s*```(?:json)?\s*|\s*```\s*\Z')
+
+def _parse_json_response(text: str):
+    """Parses a model reply; only on failure retries once with markdown fences stripped."""
+    try:
+        return _json_loads(text)
+    except json.JSONDecodeError:
+        stripped = _MD_FENCE_RE.sub('', text)
+        if stripped == text:
+            raise
+        return _json_loads(stripped)
+
+# Daily insights are short structured JSON; Flash handles them at a fraction of Pro's cost.
+# Set INSIGHTS_MODEL=gemini-2.5-pro to roll back.
+INSIGHTS_MODEL = os.environ.get("INSIGHTS_MODEL", "gemini-2.5-flash")
+
+# Replacement questions and result interpretations are short, low-complexity replies
+FAST_MODEL = os.environ.get("LLM_FAST_MODEL", "gemini-2.5-flash")
+
+# Upper bound on concurrent Gemini requests from one batch call (conditions, replacements, interpretations)
+LLM_MAX_WORKERS = 8
+
+# LRU of parsed result interpretations keyed by prompt digest (failures are not cached)
+INTERPRETATION_CACHE_MAX_SIZE = 512
+_interpretation_cache = OrderedDict()
+_interpretation_lock = threading.Lock()
+
+def _interpretation_cache_store(key: bytes, result: dict):
+    with _interpretation_lock:
+        _interpretation_cache[key] = result
+        if len(_interpretation_cache) > INTERPRETATION_CACHE_MAX_SIZE:
+            _interpretation_cache.popitem(last=False)
+
+# Prompt input budgets, in estimated tokens. The catalog is static, so it is trimmed once;
+# headlines are trimmed per request. ~4 characters per token is close enough for English
+# text and avoids a count_tokens RPC on every prompt.
+DATA_CONTEXT_TOKEN_BUDGET = int(os.environ.get("LLM_DATA_CONTEXT_TOKEN_BUDGET", 4000))
+HEADLINES_TOKEN_BUDGET = int(os.environ.get("LLM_HEADLINES_TOKEN_BUDGET", 800))
+_CHARS_PER_TOKEN = 4
+
+def _trim_lines_to_budget(text: str, max_tokens: int) -> str:
+    """Keeps whole leading lines of text up to the token budget."""
+    max_chars = max_tokens * _CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    kept = []
+    used = 0
+    for line in text.splitlines(keepends=True):
+        if used + len(line) > max_chars:
+            break
+        kept.append(line)
+        used += len(line)
+    print(f"Warning: data context trimmed to ~{max_tokens} tokens ({used} of {len(text)} chars).")
+    return "".join(kept)
+
+def _headlines_within_budget(headlines: list, max_tokens: int) -> list:
+    """Keeps headlines in their given (relevance/recency) order until the token budget is used."""
+    max_chars = max_tokens * _CHARS_PER_TOKEN
+    kept = []
+    used = 0
+    for headline in headlines:
+        # +8 covers the quotes, comma and indentation json.dumps(indent=2) adds per item
+        size = len(str(headline)) + 8
+        if kept and used + size > max_chars:
+            break
+        kept.append(headline)
+        used += size
+    return kept
+
+# Persistent LLM response cache (SQLite, WAL mode so several workers can share it).
+# Sits behind the in-memory LRUs: memory miss -> disk lookup -> RPC.
+LLM_CACHE_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'llm_cache.db')
+LLM_CACHE_TTL_SECONDS = int(os.environ.get("LLM_CACHE_TTL_HOURS", 24 * 7)) * 3600
+_disk_cache_ready = False
+_disk_cache_init_lock = threading.Lock()
+
+def _init_disk_cache():
+    """Creates the cache table on first use. Returns False if the DB is unusable."""
+    global _disk_cache_ready
+    if _disk_cache_ready:
+        return True
+    with _disk_cache_init_lock:
+        if not _disk_cache_ready:
+            try:
+                os.makedirs(os.path.dirname(LLM_CACHE_DB_PATH), exist_ok=True)
+                with sqlite3.connect(LLM_CACHE_DB_PATH) as conn:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute('''
+                        CREATE TABLE IF NOT EXISTS llm_response_cache (
+                            key TEXT PRIMARY KEY,
+                            value TEXT NOT NULL,
+                            created_at INTEGER NOT NULL
+                        )
+                    ''')
+                    # Prune expired entries once per process
+                    conn.execute("DELETE FROM llm_response_cache WHERE created_at < ?",
+                                 (int(time.time()) - LLM_CACHE_TTL_SECONDS,))
+                _disk_cache_ready = True
+            except Exception as e:
+                print(f"LLM response cache disabled: {e}")
+                return False
+    return True
+
+def _disk_cache_key(kind: str, key) -> str:
+    raw = key if isinstance(key, bytes) else key.encode('utf-8')
+    return kind + ":" + hashlib.sha256(raw).hexdigest()
+
+def _disk_cache_get(kind: str, key):
+    """Returns the cached JSON text for key, or None on miss/expiry/error."""
+    if not _init_disk_cache():
+        return None
+    try:
+        conn = sqlite3.connect(LLM_CACHE_DB_PATH)
+        try:
+            row = conn.execute(
+                "SELECT value FROM llm_response_cache WHERE key = ? AND created_at >= ?",
+                (_disk_cache_key(kind, key), int(time.time()) - LLM_CACHE_TTL_SECONDS)
+            ).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+    except Exception as e:
+        print(f"LLM response cache read failed: {e}")
+        return None
 
-        # Load available data context
-        data_context = ""
+def _disk_cache_put(kind: str, key, text: str):
+    if not _init_disk_cache():
+        return
+    try:
+        with sqlite3.connect(LLM_CACHE_DB_PATH) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_response_cache (key, value, created_at) VALUES (?, ?, ?)",
+                (_disk_cache_key(kind, key), text, int(time.time()))
+            )
+    except Exception as e:
+        print(f"LLM response cache write failed: {e}")
+
+def _disk_cache_delete(kind: str, key):
+    if not _init_disk_cache():
+        return
+    try:
+        with sqlite3.connect(LLM_CACHE_DB_PATH) as conn:
+            conn.execute("DELETE FROM llm_response_cache WHERE key = ?", (_disk_cache_key(kind, key),))
+    except Exception as e:
+        print(f"LLM response cache delete failed: {e}")
+
+# LRU of generated backtest conditions, content-addressed by (model, prompt prefix, normalized
+# query) - exact match after whitespace/case folding, and editing the prompt or data catalog
+# starts a fresh keyspace. Stores the raw JSON text so each hit returns a fresh dict.
+CONDITION_CACHE_MAX_SIZE = 512
+_condition_cache = OrderedDict()
+_condition_lock = threading.Lock()
+
+def _condition_cache_key(model_name: str, prefix: str, query: str) -> str:
+    normalized = " ".join(query.split()).lower()
+    return hashlib.blake2b(f"{model_name}\n{prefix}\n{normalized}".encode('utf-8'), digest_size=16).hexdigest()
+
+def _condition_cache_get(key: str):
+    with _condition_lock:
+        text = _condition_cache.get(key)
+        if text is not None:
+            _condition_cache.move_to_end(key)
+    if text is None:
+        # Fall back to the on-disk cache (survives restarts, shared across workers)
+        text = _disk_cache_get('condition', key)
+        if text is None:
+            return None
+        with _condition_lock:
+            _condition_cache[key] = text
+            if len(_condition_cache) > CONDITION_CACHE_MAX_SIZE:
+                _condition_cache.popitem(last=False)
+    return _parse_json_response(text)
+
+def _condition_cache_put(key: str, result, text: str):
+    # Only cache usable results; failures and empty code should be retried
+    if not isinstance(result, dict) or not result.get('code'):
+        return
+    with _condition_lock:
+        _condition_cache[key] = text
+        if len(_condition_cache) > CONDITION_CACHE_MAX_SIZE:
+            _condition_cache.popitem(last=False)
+    _disk_cache_put('condition', key, text)
+
+def _condition_cache_drop(key: str):
+    with _condition_lock:
+        _condition_cache.pop(key, None)
+    _disk_cache_delete('condition', key)
+
+# One genai.Client per process so every LLMService shares its HTTP session
+_client = None
+_client_lock = threading.Lock()
+
+def _get_client():
+    """Returns the shared genai client, or None if GOOGLE_API_KEY is not set."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                api_key = os.environ.get("GOOGLE_API_KEY")
+                if not api_key:
+                    print("Warning: GOOGLE_API_KEY not found in environment variables.")
+                    return None
+                _client = genai.Client(api_key=api_key)
+    return _client
+
+@functools.lru_cache(maxsize=1)
+def _load_data_context() -> str:
+    """Reads data/available_data.txt once per process, falling back to a short description if missing."""
+    try:
+        context_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'available_data.txt')
+        with open(context_path, 'r') as f:
+            return f.read()
+    except Exception:
+        return "Standard OHLCV data + PE ratio available."
+
+# Explicit Gemini context caching for the static prompt prefixes (opt-in).
+# The prefix is uploaded once as a CachedContent and each request only sends its suffix.
+# Prefixes below the model's minimum cacheable size fall back to plain requests.
+CONTEXT_CACHE_ENABLED = os.environ.get("GEMINI_CONTEXT_CACHE", "false").lower() in ("1", "true", "yes")
+CONTEXT_CACHE_TTL_SECONDS = int(os.environ.get("GEMINI_CONTEXT_CACHE_TTL", 3600))
+_prefix_caches = {}  # digest of (model, prefix) -> (cache name or None, expires_at epoch seconds)
+_prefix_cache_lock = threading.Lock()
+
+def _get_prefix_cache(client, model_name: str, prefix: str):
+    """
+    Returns the name of a live CachedContent holding prefix as system instruction,
+    creating it on first use (or after expiry). Returns None if caching is disabled
+    or the cache can't be created (the failure is remembered for one TTL).
+    """
+    if not CONTEXT_CACHE_ENABLED or client is None:
+        return None
+
+    key = hashlib.blake2b(f"{model_name}\n{prefix}".encode('utf-8'), digest_size=16).digest()
+    now = time.time()
+    with _prefix_cache_lock:
+        entry = _prefix_caches.get(key)
+        # Refresh a minute early so in-flight requests never reference an expired cache
+        if entry is not None and entry[1] - 60 > now:
+            return entry[0]
+
+        name = None
         try:
-            context_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'available_data.txt')
-            with open(context_path, 'r') as f:
-                data_context = f.read()
-        except Exception:
-            data_context = "Standard OHLCV data + PE ratio available."
+            cache = client.caches.create(
+                model=model_name,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=prefix,
+                    ttl=f"{CONTEXT_CACHE_TTL_SECONDS}s",
+                    display_name="datafeeds-prompt-prefix"
+                )
+            )
+            name = cache.name
+        except Exception as e:
+            print(f"LLM context cache unavailable, sending full prompts: {e}")
+        _prefix_caches[key] = (name, now + CONTEXT_CACHE_TTL_SECONDS)
+        return name
+
+def _drop_prefix_cache(cache_name: str):
+    with _prefix_cache_lock:
+        for key, (name, _) in list(_prefix_caches.items()):
+            if name == cache_name:
+                del _prefix_caches[key]
+
+# Running token totals across all Gemini calls in this process. cached_tokens shows
+# whether implicit/explicit prefix caching is actually being hit.
+_token_usage = {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0, "output_tokens": 0}
+_token_usage_lock = threading.Lock()
+
+# Gemini only caches prompt prefixes above this size (implicit and explicit caching)
+MIN_CACHEABLE_PREFIX_TOKENS = 1024
+
+def _record_usage(model_name: str, usage):
+    """Adds a response's usage_metadata to the process totals and prints it."""
+    if usage is None:
+        return
+    prompt = usage.prompt_token_count or 0
+    cached = usage.cached_content_token_count or 0
+    output = usage.candidates_token_count or 0
+    with _token_usage_lock:
+        _token_usage["requests"] += 1
+        _token_usage["prompt_tokens"] += prompt
+        _token_usage["cached_tokens"] += cached
+        _token_usage["output_tokens"] += output
+    print(f"LLM usage ({model_name}): prompt={prompt} cached={cached} output={output}")
+
+def get_token_usage() -> dict:
+    """Returns a snapshot of the process-wide token counters."""
+    with _token_usage_lock:
+        return dict(_token_usage)
+
+@functools.lru_cache(maxsize=None)
+def _check_prefix_cacheable(name: str, prefix: str):
+    """Warns once per prefix if it has (by estimate) dropped below Gemini's cacheable size."""
+    estimated = len(prefix) // _CHARS_PER_TOKEN
+    if estimated < MIN_CACHEABLE_PREFIX_TOKENS:
+        print(f"Warning: {name} prompt prefix is ~{estimated} tokens, below the "
+              f"{MIN_CACHEABLE_PREFIX_TOKENS}-token minimum for Gemini prompt caching.")
+
+def _read_json_stream(chunks, model_name: str = None) -> str:
+    """
+    Accumulates streamed response chunks until the top-level JSON object/array closes,
+    then closes the stream. Braces inside JSON strings are ignored.
+    The latest usage_metadata seen is recorded against model_name.
+    """
+    parts = []
+    depth = 0
+    in_string = False
+    escaped = False
+    usage = None
+    try:
+        for chunk in chunks:
+            usage = getattr(chunk, 'usage_metadata', None) or usage
+            text = chunk.text or ""
+            for idx, ch in enumerate(text):
+                if in_string:
+                    if escaped:
+                        escaped = False
+                    elif ch == '\\':
+                        escaped = True
+                    elif ch == '"':
+                        in_string = False
+                elif ch == '"':
+                    in_string = True
+                elif ch in '{[':
+                    depth += 1
+                elif ch in '}]':
+                    depth -= 1
+                    if depth == 0:
+                        parts.append(text[:idx + 1])
+                        return "".join(parts)
+            parts.append(text)
+        return "".join(parts)
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close:
+            close()
+        if model_name:
+            _record_usage(model_name, usage)
+
+# Transient Gemini failures (rate limits, 5xx, timeouts) are retried with jittered
+# exponential backoff; anything else fails straight through to the caller's handler.
+LLM_RETRY_ATTEMPTS = int(os.environ.get("LLM_RETRY_ATTEMPTS", 4))
+
+def _is_transient_llm_error(exc: BaseException) -> bool:
+    if isinstance(exc, genai_errors.ServerError):
+        return True
+    if isinstance(exc, genai_errors.ClientError):
+        return exc.code == 429
+    return isinstance(exc, httpx.TimeoutException)
 
-        prompt = textwrap.dedent(f"""
+def _log_llm_retry(retry_state):
+    print(f"LLM transient error (attempt {retry_state.attempt_number}/{LLM_RETRY_ATTEMPTS}), "
+          f"retrying in {retry_state.next_action.sleep:.1f}s: {retry_state.outcome.exception()}")
+
+_llm_retry = tenacity.retry(
+    retry=tenacity.retry_if_exception(_is_transient_llm_error),
+    wait=tenacity.wait_exponential_jitter(initial=1, max=16),
+    stop=tenacity.stop_after_attempt(LLM_RETRY_ATTEMPTS),
+    before_sleep=_log_llm_retry,
+    reraise=True
+)
+
+# Circuit breaker: after CIRCUIT_FAIL_MAX consecutive transient failures (each already
+# retried), Gemini calls fail fast for CIRCUIT_RESET_SECONDS instead of waiting out
+# timeouts. The first call after that is a trial; one more failure reopens the circuit.
+CIRCUIT_FAIL_MAX = int(os.environ.get("LLM_CIRCUIT_FAIL_MAX", 5))
+CIRCUIT_RESET_SECONDS = int(os.environ.get("LLM_CIRCUIT_RESET_SECONDS", 30))
+_circuit = {"failures": 0, "open_until": 0.0}
+_circuit_lock = threading.Lock()
+
+class LLMUnavailableError(Exception):
+    """Raised instead of calling Gemini while the circuit breaker is open."""
+
+def _circuit_check():
+    with _circuit_lock:
+        remaining = _circuit["open_until"] - time.time()
+    if remaining > 0:
+        raise LLMUnavailableError(f"Gemini circuit open for another {remaining:.0f}s")
+
+def _circuit_record(exc: BaseException = None):
+    with _circuit_lock:
+        if exc is None:
+            _circuit["failures"] = 0
+            return
+        if not _is_transient_llm_error(exc):
+            return
+        _circuit["failures"] += 1
+        if _circuit["failures"] >= CIRCUIT_FAIL_MAX:
+            _circuit["open_until"] = time.time() + CIRCUIT_RESET_SECONDS
+            print(f"LLM circuit open after {_circuit['failures']} consecutive failures; "
+                  f"skipping Gemini calls for {CIRCUIT_RESET_SECONDS}s")
+
+def _circuit_breaker(func):
+    """Wraps a Gemini call with the circuit breaker."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        _circuit_check()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            _circuit_record(e)
+            raise
+        _circuit_record()
+        return result
+    return wrapper
+
+# Every prompt asks for JSON only; response mode makes the model emit bare JSON
+# (no markdown fences), so replies go straight to json.loads.
+_JSON_CONFIG = types.GenerateContentConfig(response_mime_type='application/json')
+
+class BacktestResponse(BaseModel):
+    """Shape of a generated backtest condition, enforced server-side via response_schema."""
+    code: str
+    periods: Optional[list[str]] = None
+
+class InsightQuestion(BaseModel):
+    """One backtesting question from the insights or replacement prompts."""
+    question: str
+    insight_explanation: str
+    predictive_score: int
+
+class InsightsResponse(BaseModel):
+    """Shape of a daily insights reply."""
+    intrigue_score: int
+    date: str
+    summary: str
+    top_news: list[str]
+    questions: list[InsightQuestion]
+
+class ResultInterpretation(BaseModel):
+    """Shape of a backtest result interpretation."""
+    result_explanation: str
+
+class StockNewsAnalysis(BaseModel):
+    """Shape of a per-ticker news analysis."""
+    summary: str
+    sentiment: Literal['bullish', 'bearish', 'neutral', 'mixed']
+    key_themes: list[str]
+    price_context: str
+    notable_headline: str
+
+# Fixed sampling for replies that get cached by input: the cached answer is then the
+# answer the model would (nearly always) give again.
+DETERMINISTIC_SEED = 42
+
+def _json_config(schema=None, cached_content: str = None, system_instruction: str = None,
+                 deterministic: bool = False) -> types.GenerateContentConfig:
+    """
+    JSON-mode config, optionally constrained to a response schema and carrying the static
+    prompt prefix either as a context cache or as the system instruction.
+    deterministic=True pins temperature to 0 and sets a fixed seed.
+    """
+    if schema is None and cached_content is None and system_instruction is None and not deterministic:
+        return _JSON_CONFIG
+    return types.GenerateContentConfig(
+        response_mime_type='application/json',
+        response_schema=schema,
+        cached_content=cached_content,
+        system_instruction=system_instruction,
+        temperature=0.0 if deterministic else None,
+        seed=DETERMINISTIC_SEED if deterministic else None
+    )
+
+# Prompt templates are built once at import. Each prompt is a static prefix (rules,
+# examples, data catalog - filled in once per LLMService), sent as the system
+# instruction, plus a short dynamic suffix sent as the contents, so consecutive
+# requests share an identical leading block that Gemini's implicit prompt caching can reuse.
+_BACKTEST_PREFIX = textwrap.dedent("""
             You are an expert Python developer for a financial backtesting application.
             Your task is to:
             1. Convert a user's natural language query into a Python function named `condition`.
@@ -114,72 +582,15 @@ class LLMService:
                 "periods": null
             }}
 
-            ### User Query
-            "{query}"
-            
-            ### Generated JSON
-        """)
-        
-        # --- LOGGING START ---
-        print("\n" + "="*60)
-        print(f"🚀 [generate_backtest_condition] Sending to {self.model_name}:")
-        print("-" * 20)
-        print(prompt)
-        print("="*60 + "\n")
-        # --- LOGGING END ---
+        """).strip() + "\n"
 
-        try:
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=prompt
-            )
-            text = response.text.strip()
-            
-            # Clean up any potential markdown formatting if the model ignores the rule
-            if text.startswith("```json"):
-                text = text[7:]
-            if text.startswith("```"):
-                text = text[3:]
-            if text.endswith("```"):
-                text = text[:-3]
-                
-            # Parse JSON
-            import json
-            result = json.loads(text.strip())
-            return result
-            
-        except Exception as e:
-            print(f"Error generating code from LLM: {e}")
-            return {"code": "", "periods": None}
+# The backtest suffix only wraps the query, so it is plain concatenation (no format parsing)
+_BACKTEST_QUERY_OPEN = '\n### User Query\n"'
+_BACKTEST_QUERY_CLOSE = '"\n\n### Generated JSON\n'
 
-    def generate_daily_insights(self, market_stats, headlines):
-        """
-        Analyzes the day and returns a JSON with a score and questions.
-        """
-        if not self.client:
-            return {"intrigue_score": 0, "error": "LLM client not initialized"}
-        
-        # Load available data context for the questions generation
-        data_context = ""
-        try:
-            context_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'available_data.txt')
-            with open(context_path, 'r') as f:
-                data_context = f.read()
-        except Exception:
-            data_context = "Standard OHLCV data + PE ratio available."
-
-        prompt = f"""
+_INSIGHTS_PREFIX = textwrap.dedent("""
         You are a Senior Quantitative Analyst. Your goal is to identify non-obvious but statistically sound market patterns to test.
         
-        ### Market Data
-        - Date: {market_stats['date']}
-        - Return: {market_stats['return_pct']}%
-        - Relative Volume: {market_stats['volume_rel']}x normal
-        - Volatility Rank: {market_stats['volatility_rank']} (Z-Score)
-        
-        ### Top Headlines
-        {json.dumps(headlines, indent=2)}
-        
         ### Available Data for Backtesting
         You can ask questions that reference any of the following data points:
         {data_context}
@@ -205,7 +616,7 @@ class LLMService:
         ### Output Format (JSON ONLY)
         {{
             "intrigue_score": 75,
-            "date": "{market_stats['date']}",
+            "date": "YYYY-MM-DD",
             "summary": "...",
             "top_news": ["..."],
             "questions": [
@@ -221,59 +632,22 @@ class LLMService:
                 }}
             ]
         }}
-        """
-        
-        # --- LOGGING START ---
-        print("\n" + "="*60)
-        print(f"🚀 [generate_daily_insights] Sending to {self.model_name}:")
-        print("-" * 20)
-        print(prompt)
-        print("="*60 + "\n")
-        # --- LOGGING END ---
+        """).strip() + "\n"
 
-        try:
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=prompt
-            )
-            # Clean up markdown
-            text = response.text.strip()
-            if text.startswith("```json"):
-                text = text[7:]
-            if text.startswith("```"):
-                text = text[3:]
-            if text.endswith("```"):
-                text = text[:-3]
-            return json.loads(text.strip())
-        except Exception as e:
-            print(f"LLM Insight Error: {e}")
-            return {"intrigue_score": 0, "error": str(e)}
-            
-    def generate_replacement_question(self, market_stats, bad_question, reason):
-        """
-        Generates a single replacement question because the previous one failed validation.
-        """
-        if not self.client:
-            return None
+_INSIGHTS_SUFFIX = """
+### Market Data
+- Date: {date}
+- Return: {return_pct}%
+- Relative Volume: {volume_rel}x normal
+- Volatility Rank: {volatility_rank} (Z-Score)
 
-        # Load available data context
-        data_context = ""
-        try:
-            context_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'available_data.txt')
-            with open(context_path, 'r') as f:
-                data_context = f.read()
-        except Exception:
-            data_context = "Standard OHLCV data + PE ratio available."
+### Top Headlines
+{headlines}
+"""
 
-        prompt = f"""
+_REPLACEMENT_PREFIX = textwrap.dedent("""
         You are a Senior Quantitative Analyst. 
-        The previous backtesting question you generated was invalid.
-        
-        ### Invalid Question
-        "{bad_question}"
-        
-        ### Reason for Failure
-        {reason}
+        The previous backtesting question you generated was invalid (see the invalid question and failure reason at the end).
         
         ### Task
         Generate ONE replacement backtesting question that is:
@@ -286,10 +660,6 @@ class LLMService:
            * **ADAPTIVE HORIZONS**: If the question is short-term (e.g. "reversal day"), include at least one medium-term period (1Y) to check for lasting impact. If the question is long-term (e.g. "high P/E"), include long horizons (3Y, 5Y, 10Y).
            * Do NOT default to "1M, 3M, 6M" blindly. Choose horizons that match the hypothesis.
         
-        ### Market Data
-        - Date: {market_stats['date']}
-        - Return: {market_stats['return_pct']}%
-        
         ### Available Data
         {data_context}
 
@@ -299,33 +669,196 @@ class LLMService:
             "insight_explanation": "Why this question matters...",
             "predictive_score": 80
         }}
+        """).strip() + "\n"
+
+_REPLACEMENT_SUFFIX = """
+### Invalid Question
+"{bad_question}"
+
+### Reason for Failure
+{reason}
+
+### Market Data
+- Date: {date}
+- Return: {return_pct}%
+"""
+
+class LLMService:
+    def __init__(self):
+        self.client = _get_client()
+        self.model_name = 'gemini-2.5-pro'
+        self.insights_model_name = INSIGHTS_MODEL
+        self.fast_model_name = FAST_MODEL
+
+        # Data catalog is static for the process lifetime; read it once per process
+        self._data_context = _trim_lines_to_budget(_load_data_context(), DATA_CONTEXT_TOKEN_BUDGET)
+
+        # Static prompt prefixes with the catalog filled in (identical across requests)
+        self._backtest_prefix = _BACKTEST_PREFIX.format(data_context=self._data_context)
+        self._insights_prefix = _INSIGHTS_PREFIX.format(data_context=self._data_context)
+        self._replacement_prefix = _REPLACEMENT_PREFIX.format(data_context=self._data_context)
+
+        # The backtest prefix is the one large enough to cache; catch edits that shrink it below the minimum
+        _check_prefix_cacheable("backtest", self._backtest_prefix)
+
+    @_circuit_breaker
+    @_llm_retry
+    def _generate_content(self, **kwargs):
+        response = self.client.models.generate_content(**kwargs)
+        _record_usage(kwargs.get('model'), getattr(response, 'usage_metadata', None))
+        return response
+
+    @_circuit_breaker
+    @_llm_retry
+    def _stream_json(self, **kwargs) -> str:
+        return _read_json_stream(self.client.models.generate_content_stream(**kwargs), kwargs.get('model'))
+
+    def _generate_json_with_prefix(self, prefix: str, suffix: str, stream: bool = False, schema=None, model: str = None,
+                                   deterministic: bool = False) -> str:
+        """
+        Sends the static prefix as the system instruction and the suffix as the request
+        contents, in JSON mode, and returns the JSON text. With context caching enabled the
+        prefix is served from a CachedContent instead.
+        stream=True reads the reply incrementally and stops as soon as the top-level JSON
+        value is complete. schema (a pydantic model) constrains the reply server-side.
+        model overrides self.model_name for this request; deterministic is passed to _json_config.
         """
+        model = model or self.model_name
+
+        def request(contents, config):
+            if stream:
+                return self._stream_json(model=model, contents=contents, config=config)
+            return self._generate_content(model=model, contents=contents, config=config).text
+
+        cache_name = _get_prefix_cache(self.client, model, prefix)
+        if cache_name:
+            try:
+                return request(suffix, _json_config(schema, cache_name, deterministic=deterministic))
+            except LLMUnavailableError:
+                raise
+            except Exception as e:
+                # Most likely the cache expired or was evicted server-side; recreate next time
+                print(f"LLM cached-prefix request failed, retrying with full prompt: {e}")
+                _drop_prefix_cache(cache_name)
+
+        return request(suffix, _json_config(schema, system_instruction=prefix, deterministic=deterministic))
+
+    def generate_backtest_condition(self, query: str) -> dict:
+        """
+        Generates a Python function string and extracted periods from a natural language query.
+        Returns a dict: {'code': str, 'periods': list[str] or None}
+        """
+        if not self.client:
+            return {"code": "", "periods": None}
+
+        cache_key = _condition_cache_key(self.model_name, self._backtest_prefix, query)
+        cached = _condition_cache_get(cache_key)
+        if cached is not None:
+            return cached
+
+        suffix = _BACKTEST_QUERY_OPEN + query + _BACKTEST_QUERY_CLOSE
         
-        # --- LOGGING START ---
-        print("\n" + "="*60)
-        print(f"🚀 [generate_replacement_question] Sending to {self.model_name}:")
-        print("-" * 20)
-        print(prompt)
-        print("="*60 + "\n")
-        # --- LOGGING END ---
+        logger.debug("[generate_backtest_condition] Sending to %s:\n%s%s", self.model_name, self._backtest_prefix, suffix)
 
         try:
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=prompt
+            # Streamed: the user is waiting on this one, and parsing can start at the closing brace
+            text = self._generate_json_with_prefix(
+                self._backtest_prefix, suffix, stream=True, schema=BacktestResponse, deterministic=True
             )
-            text = response.text.strip()
-            if text.startswith("```json"):
-                text = text[7:]
-            if text.startswith("```"):
-                text = text[3:]
-            if text.endswith("```"):
-                text = text[:-3]
-            return json.loads(text.strip())
+            result = _parse_json_response(text)
+            
+        except Exception as e:
+            print(f"Error generating code from LLM: {e}")
+            return {"code": "", "periods": None}
+
+        _condition_cache_put(cache_key, result, text)
+        return result
+
+    def forget_backtest_condition(self, query: str):
+        """
+        Evicts the cached condition for query so the next call asks the model again.
+        Callers use this when the generated code fails to run or yields no usable results.
+        """
+        _condition_cache_drop(_condition_cache_key(self.model_name, self._backtest_prefix, query))
+
+    def generate_backtest_conditions(self, queries: list) -> list:
+        """
+        Generates conditions for several queries concurrently.
+        Returns results in the same order as queries.
+        """
+        if not queries:
+            return []
+
+        # Capped to stay well inside Gemini rate limits
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(LLM_MAX_WORKERS, len(queries))) as executor:
+            return list(executor.map(self.generate_backtest_condition, queries))
+
+    def generate_daily_insights(self, market_stats, headlines):
+        """
+        Analyzes the day and returns a JSON with a score and questions.
+        """
+        if not self.client:
+            return {"intrigue_score": 0, "error": "LLM client not initialized"}
+        
+        suffix = _INSIGHTS_SUFFIX.format(
+            date=market_stats['date'],
+            return_pct=market_stats['return_pct'],
+            volume_rel=market_stats['volume_rel'],
+            volatility_rank=market_stats['volatility_rank'],
+            headlines=json.dumps(_headlines_within_budget(headlines, HEADLINES_TOKEN_BUDGET), indent=2)
+        )
+        
+        logger.debug("[generate_daily_insights] Sending to %s:\n%s%s", self.insights_model_name, self._insights_prefix, suffix)
+
+        try:
+            # Streamed so the reply is parsed as soon as its closing brace arrives
+            return _parse_json_response(self._generate_json_with_prefix(
+                self._insights_prefix, suffix, stream=True, schema=InsightsResponse, model=self.insights_model_name
+            ))
+        except Exception as e:
+            print(f"LLM Insight Error: {e}")
+            return {"intrigue_score": 0, "error": str(e)}
+            
+    def generate_replacement_question(self, market_stats, bad_question, reason):
+        """
+        Generates a single replacement question because the previous one failed validation.
+        """
+        if not self.client:
+            return None
+
+        suffix = _REPLACEMENT_SUFFIX.format(
+            bad_question=bad_question,
+            reason=reason,
+            date=market_stats['date'],
+            return_pct=market_stats['return_pct']
+        )
+        
+        logger.debug("[generate_replacement_question] Sending to %s:\n%s%s", self.fast_model_name, self._replacement_prefix, suffix)
+
+        try:
+            return _parse_json_response(self._generate_json_with_prefix(
+                self._replacement_prefix, suffix, schema=InsightQuestion, model=self.fast_model_name
+            ))
         except Exception as e:
             print(f"LLM Replacement Error: {e}")
             return None
 
+    def generate_replacement_questions(self, market_stats, failures: list) -> list:
+        """
+        Requests replacements for several (bad_question, reason) failures concurrently.
+        Returns results (dict or None) in the same order as failures.
+        """
+        if not failures:
+            return []
+
+        def replace(failure):
+            bad_question, reason = failure
+            return self.generate_replacement_question(market_stats, bad_question, reason)
+
+        # Capped to stay well inside Gemini rate limits
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(LLM_MAX_WORKERS, len(failures))) as executor:
+            return list(executor.map(replace, failures))
+
     def generate_result_interpretation(self, question, results_data):
         """
         Generates a brief interpretation of the backtest results.
@@ -369,43 +902,60 @@ class LLMService:
         }}
         """
         
-        # --- LOGGING START ---
-        print("\n" + "="*60)
-        print(f"🚀 [generate_result_interpretation] Sending to {self.model_name}:")
-        print("-" * 20)
-        print(prompt)
-        print("="*60 + "\n")
-        # --- LOGGING END ---
+        # The prompt fully determines the answer, so it doubles as the cache key
+        # (retries and replacement re-runs re-ask for identical results).
+        key = hashlib.blake2b(f"{self.fast_model_name}\n{prompt}".encode('utf-8'), digest_size=16).digest()
+        with _interpretation_lock:
+            cached = _interpretation_cache.get(key)
+            if cached is not None:
+                _interpretation_cache.move_to_end(key)
+                return dict(cached)
+
+        text = _disk_cache_get('interpretation', key)
+        if text is not None:
+            result = _parse_json_response(text)
+            _interpretation_cache_store(key, result)
+            return dict(result)
+
+        logger.debug("[generate_result_interpretation] Sending to %s:\n%s", self.fast_model_name, prompt)
 
         try:
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=prompt
+            response = self._generate_content(
+                model=self.fast_model_name,
+                contents=prompt,
+                config=_json_config(ResultInterpretation)
             )
-            text = response.text.strip()
-            
-            # Clean up markdown code blocks
-            if text.startswith("```json"):
-                text = text[7:]
-            elif text.startswith("```"):
-                text = text[3:]
-            if text.endswith("```"):
-                text = text[:-3]
-            
-            text = text.strip()
-            
-            try:
-                return json.loads(text)
-            except json.JSONDecodeError:
-                # Fallback: if not valid JSON, treat the whole text as the explanation
-                # Remove any JSON-like brackets if they exist but are malformed
-                clean_text = text.replace('{', '').replace('}', '').replace('"result_explanation":', '').strip().strip('"')
-                return {"result_explanation": clean_text}
+            text = response.text
+            result = _parse_json_response(text)
                 
         except Exception as e:
             print(f"LLM Result Interpretation Error: {e}")
             return {"result_explanation": "Unable to interpret results."}
 
+        _interpretation_cache_store(key, result)
+        _disk_cache_put('interpretation', key, text)
+        return dict(result)
+
+    def generate_result_interpretations(self, pairs: list, max_workers: int = None) -> list:
+        """
+        Interprets several (question, results_data) pairs concurrently.
+        Returns interpretation dicts in the same order as pairs.
+        """
+        if not pairs:
+            return []
+
+        def interpret(pair):
+            try:
+                return self.generate_result_interpretation(*pair)
+            except Exception as e:
+                print(f"LLM Result Interpretation Error: {e}")
+                return {"result_explanation": "Unable to interpret results."}
+
+        # Capped to stay well inside Gemini rate limits
+        workers = max_workers or min(LLM_MAX_WORKERS, len(pairs))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(interpret, pairs))
+
     def generate_portfolio_analysis(self, user_profile: dict, portfolio_data: dict, market_analysis: dict, secular_trends: str) -> dict:
         """
         Generates personalized portfolio analysis and recommendations.
@@ -578,34 +1128,20 @@ Provide explanations at {explanation_level}.
 }}
 """
         
-        # --- LOGGING START ---
-        print("\n" + "="*60)
-        print(f"🚀 [generate_portfolio_analysis] Sending to {self.model_name}:")
-        print("-" * 20)
-        print(prompt[:2000] + "..." if len(prompt) > 2000 else prompt)
-        print("="*60 + "\n")
-        # --- LOGGING END ---
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[generate_portfolio_analysis] Sending to %s:\n%s", self.model_name, prompt[:2000] + "..." if len(prompt) > 2000 else prompt)
 
         try:
-            response = self.client.models.generate_content(
+            response = self._generate_content(
                 model=self.model_name,
-                contents=prompt
+                contents=prompt,
+                config=_JSON_CONFIG
             )
-            text = response.text.strip()
-            
-            # Clean up markdown code blocks
-            if text.startswith("```json"):
-                text = text[7:]
-            elif text.startswith("```"):
-                text = text[3:]
-            if text.endswith("```"):
-                text = text[:-3]
-            
-            text = text.strip()
-            
+            text = response.text
+
             try:
-                result = json.loads(text)
-                result['generated_at'] = __import__('datetime').datetime.now().isoformat()
+                result = _parse_json_response(text)
+                result['generated_at'] = datetime.now().isoformat()
                 return result
             except json.JSONDecodeError as e:
                 print(f"JSON Parse Error: {e}")
@@ -694,21 +1230,12 @@ Provide a concise analysis of what these headlines mean for the stock. Focus on:
 """
         
         try:
-            response = self.client.models.generate_content(
+            response = self._generate_content(
                 model=self.model_name,
-                contents=prompt
+                contents=prompt,
+                config=_json_config(StockNewsAnalysis)
             )
-            text = response.text.strip()
-            
-            # Clean up markdown
-            if text.startswith("```json"):
-                text = text[7:]
-            elif text.startswith("```"):
-                text = text[3:]
-            if text.endswith("```"):
-                text = text[:-3]
-            
-            result = json.loads(text.strip())
+            result = _parse_json_response(response.text)
             result['ticker'] = ticker
             result['company_name'] = company_name
             result['headlines'] = headlines[:3]
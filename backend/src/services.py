@@ -1,12 +1,23 @@
 import pandas as pd
 from .data_loader import DataLoader
-from .backtester import Backtester
+from .backtester import Backtester, MISSING_DATA
 from .llm_service import LLMService
 import json
 import os
 import uuid
+import time
+import threading
+import concurrent.futures
+import hashlib
+from collections import OrderedDict
 import numpy as np
 
+# orjson is optional; it's several times faster for the JSON files this module reads and writes
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Global instances (simple in-memory cache)
 loader = None
 price_data = None
@@ -14,25 +25,124 @@ pe_data = None
 bt = None
 llm_service = None
 
-SAVED_QUERIES_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'saved_queries.json')
+# The merged price + P/E frame is written to Parquet so cold starts skip yfinance and the
+# Shiller JSON. Refetched once the file is older than MERGED_CACHE_TTL_SECONDS.
+MERGED_CACHE_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'merged.parquet')
+MERGED_CACHE_TTL_SECONDS = int(os.environ.get("MERGED_CACHE_TTL_SECONDS", 86400))
+
+# Saved queries are stored as JSON lines (one query per line) so saving is a single append.
+# The old single-array file is converted on first access.
+SAVED_QUERIES_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'saved_queries.jsonl')
+LEGACY_SAVED_QUERIES_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'saved_queries.json')
+
+# Parsed saved queries, reused until the file's mtime changes
+_saved_queries_cache = {'mtime': None, 'data': []}
+_saved_queries_lock = threading.Lock()
+
+# LRU of scenario results. bt.data is loaded once per process, so results only change
+# if it is replaced; id(bt.data) in the key covers that. Errors are not cached.
+SCENARIO_CACHE_MAX_SIZE = 64
+_scenario_cache = OrderedDict()
+_scenario_cache_lock = threading.Lock()
+
+def _scenario_cache_get(bt, key):
+    with _scenario_cache_lock:
+        full_key = key + (id(bt.data),)
+        if full_key in _scenario_cache:
+            _scenario_cache.move_to_end(full_key)
+            return _scenario_cache[full_key]
+    return None
+
+def _scenario_cache_put(bt, key, result):
+    if "error" in result:
+        return
+    with _scenario_cache_lock:
+        _scenario_cache[key + (id(bt.data),)] = result
+        if len(_scenario_cache) > SCENARIO_CACHE_MAX_SIZE:
+            _scenario_cache.popitem(last=False)
+
+_backtester_lock = threading.Lock()
+
+def _load_merged_cache():
+    """Returns the merged frame from MERGED_CACHE_FILE if it is fresh, else None."""
+    try:
+        if not os.path.exists(MERGED_CACHE_FILE):
+            return None
+        age = time.time() - os.path.getmtime(MERGED_CACHE_FILE)
+        if age > MERGED_CACHE_TTL_SECONDS:
+            print(f"Merged data cache is {age / 3600:.1f}h old, refetching.")
+            return None
+        df = pd.read_parquet(MERGED_CACHE_FILE, engine='pyarrow')
+        print(f"Loaded merged data from {MERGED_CACHE_FILE} ({len(df)} rows).")
+        return df
+    except Exception as e:
+        print(f"Warning: Could not read merged data cache: {e}")
+        return None
+
+def _save_merged_cache(df):
+    """Writes the merged frame to MERGED_CACHE_FILE; a failed write only costs the next cold start."""
+    if df is None or df.empty:
+        # A failed download; don't serve it from disk until the TTL runs out
+        return
+    tmp_path = MERGED_CACHE_FILE + '.tmp'
+    try:
+        os.makedirs(os.path.dirname(MERGED_CACHE_FILE), exist_ok=True)
+        df.to_parquet(tmp_path, engine='pyarrow', compression='zstd')
+        # Readers in other processes never see a half-written file
+        os.replace(tmp_path, MERGED_CACHE_FILE)
+    except Exception as e:
+        print(f"Warning: Could not write merged data cache: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
 def get_backtester():
     global loader, price_data, pe_data, bt, llm_service
-    if bt is None:
-        loader = DataLoader()
-        # Fetching max history available from yfinance
-        price_data = loader.fetch_sp500_data(start_date="1927-01-01")
-        # Load P/E data
-        pe_data = loader.load_pe_data("data/flat-ui__data-Sat Nov 22 2025.json")
-        # Merge
-        df = loader.merge_data(price_data, pe_data)
-        bt = Backtester(df)
-        
-    if llm_service is None:
-        llm_service = LLMService()
+    if bt is None or llm_service is None:
+        # Only one thread loads; concurrent first requests wait for it instead of re-downloading
+        with _backtester_lock:
+            if bt is None:
+                loader = DataLoader()
+                df = _load_merged_cache()
+                if df is None:
+                    # Fetching max history available from yfinance
+                    price_data = loader.fetch_sp500_data(start_date="1927-01-01")
+                    # Load P/E data
+                    pe_data = loader.load_pe_data("data/flat-ui__data-Sat Nov 22 2025.json")
+                    # Merge
+                    df = loader.merge_data(price_data, pe_data)
+                    _save_merged_cache(df)
+                bt = Backtester(df)
+                
+            if llm_service is None:
+                llm_service = LLMService()
         
     return bt, llm_service
 
+# Period sets the built-in scenarios and _execute_code's default ask baseline stats for
+BASELINE_PERIOD_SETS = [
+    ['1W'],
+    ['1M', '3M', '6M', '1Y'],
+    ['1Y', '3Y', '5Y', '10Y'],
+    ['1W', '1M', '3M', '6M', '1Y', '3Y', '5Y', '10Y'],
+]
+
+def start_backtester_warmup():
+    """
+    Loads market data and the LLM service in a background thread so the first request finds
+    them ready, then fills the baseline stats cache for the common period sets.
+    """
+    def warm():
+        try:
+            bt, _ = get_backtester()
+            for periods in BASELINE_PERIOD_SETS:
+                bt.get_baseline_stats(periods=periods)
+            print("Backtester warm-up complete.")
+        except Exception as e:
+            # The first request will retry the load through get_backtester()
+            print(f"Backtester warm-up failed: {e}")
+
+    threading.Thread(target=warm, name="backtester-warmup", daemon=True).start()
+
 def format_signals(signals_df, max_samples=3000):
     """
     Formats the signals dataframe into a list of dictionaries for the frontend.
@@ -41,41 +151,35 @@ def format_signals(signals_df, max_samples=3000):
     """
     # Cap the number of points to prevent frontend lag
     if len(signals_df) > max_samples:
-        # Random sample then sort by index to keep chronological order
-        signals_df = signals_df.sample(n=max_samples, random_state=42).sort_index()
-
-    records = []
-    for index, row in signals_df.iterrows():
-        record = {
-            'date': index.strftime('%Y-%m-%d'),
-            'price': row['Adj Close']
-        }
-        for col in row.index:
-            if col.startswith('FwdReturn_'):
-                period = col.replace('FwdReturn_', '')
-                val = row[col]
-                # Handle NaN/Infinity for JSON serialization
-                if pd.isna(val) or np.isinf(val):
-                    record[period] = None
-                else:
-                    record[period] = val
-        records.append(record)
-    return records
+        # Evenly spaced rows: already chronological, so no shuffle or sort needed
+        positions = np.linspace(0, len(signals_df) - 1, max_samples).astype(np.intp)
+        signals_df = signals_df.iloc[positions]
+
+    fwd_cols = [col for col in signals_df.columns if col.startswith('FwdReturn_')]
+    keys = ['date', 'price'] + [col.replace('FwdReturn_', '') for col in fwd_cols]
+
+    # One 2-D float array; NaN/Infinity become None (valid JSON) in a single pass
+    values = signals_df[['Adj Close'] + fwd_cols].to_numpy(dtype=float)
+    rows = np.where(np.isfinite(values), values, None).tolist()
+    dates = signals_df.index.strftime('%Y-%m-%d').tolist()
+    return [dict(zip(keys, [date] + row)) for date, row in zip(dates, rows)]
 
 def run_november_scenario():
     bt, _ = get_backtester()
+    cached = _scenario_cache_get(bt, ('november',))
+    if cached is not None:
+        return cached
     
     def condition_november_negative(data):
-        mask = pd.Series(False, index=data.index)
         monthly_data = data['Adj Close'].resample('ME').last()
         monthly_returns = monthly_data.pct_change()
         neg_novs = monthly_returns[(monthly_returns.index.month == 11) & (monthly_returns < 0)]
         
-        for date in neg_novs.index:
-            loc = data.index.get_indexer([date], method='pad')[0]
-            if loc != -1:
-                mask.iloc[loc] = True
-        return mask
+        # Map each month-end to the last trading day on or before it, all at once
+        locs = data.index.get_indexer(neg_novs.index, method='pad')
+        mask = np.zeros(len(data), dtype=bool)
+        mask[locs[locs != -1]] = True
+        return pd.Series(mask, index=data.index)
 
     periods = ['1M', '3M', '6M', '1Y']
     mask = bt.filter_dates(condition_november_negative)
@@ -86,14 +190,19 @@ def run_november_scenario():
     signals_df = bt.get_signals(mask, periods=periods)
     signals_data = format_signals(signals_df)
     
-    return {
+    result = {
         "results": results,
         "control": control_results,
         "signals": signals_data
     }
+    _scenario_cache_put(bt, ('november',), result)
+    return result
 
 def run_friday_scenario():
     bt, _ = get_backtester()
+    cached = _scenario_cache_get(bt, ('friday',))
+    if cached is not None:
+        return cached
     
     def condition_friday_negative(data):
         return (data.index.dayofweek == 4) & (data['Return'] < 0)
@@ -106,14 +215,19 @@ def run_friday_scenario():
     signals_df = bt.get_signals(mask, periods=periods)
     signals_data = format_signals(signals_df)
     
-    return {
+    result = {
         "results": results,
         "control": control_results,
         "signals": signals_data
     }
+    _scenario_cache_put(bt, ('friday',), result)
+    return result
 
 def run_pe_scenario():
     bt, _ = get_backtester()
+    cached = _scenario_cache_get(bt, ('high_pe',))
+    if cached is not None:
+        return cached
     
     def condition_high_pe(data):
         if 'PE' not in data.columns:
@@ -128,15 +242,20 @@ def run_pe_scenario():
     signals_df = bt.get_signals(mask, periods=periods)
     signals_data = format_signals(signals_df)
     
-    return {
+    result = {
         "results": results,
         "control": control_results,
         "signals": signals_data
     }
+    _scenario_cache_put(bt, ('high_pe',), result)
+    return result
 
 def run_pe_range_scenario(min_pe, max_pe):
     """Generic function to run P/E range scenarios"""
     bt, _ = get_backtester()
+    cached = _scenario_cache_get(bt, ('pe_range', min_pe, max_pe))
+    if cached is not None:
+        return cached
     
     def condition_pe_range(data):
         if 'PE' not in data.columns:
@@ -151,11 +270,27 @@ def run_pe_range_scenario(min_pe, max_pe):
     signals_df = bt.get_signals(mask, periods=periods)
     signals_data = format_signals(signals_df)
     
-    return {
+    result = {
         "results": results,
         "control": control_results,
         "signals": signals_data
     }
+    _scenario_cache_put(bt, ('pe_range', min_pe, max_pe), result)
+    return result
+
+# The P/E bands behind the run_pe_16_17 ... run_pe_22_23 endpoints
+PE_RANGES = [(16, 17), (17, 18), (18, 19), (19, 20), (20, 21), (21, 22), (22, 23)]
+
+def run_pe_ranges_batch(ranges=None):
+    """
+    Runs several P/E range scenarios concurrently and returns {"lo-hi": result} in input order.
+    The ranges only read precomputed columns of the shared data, so threads are safe here.
+    """
+    ranges = ranges or PE_RANGES
+    get_backtester()  # load once up front rather than racing on first use
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(ranges), os.cpu_count() or 1)) as executor:
+        results = list(executor.map(lambda r: run_pe_range_scenario(*r), ranges))
+    return {f"{lo}-{hi}": result for (lo, hi), result in zip(ranges, results)}
 
 def run_pe_16_17():
     return run_pe_range_scenario(16, 17)
@@ -179,21 +314,52 @@ def run_pe_22_23():
     return run_pe_range_scenario(22, 23)
 
 
+# Compiled condition functions keyed by code digest, so saved/regenerated code skips exec
+CONDITION_FUNC_CACHE_MAX_SIZE = 256
+_condition_funcs = OrderedDict()
+_condition_funcs_lock = threading.Lock()
+
+# Names available to generated conditions (the LLM prompt promises pd and np).
+# Built once; each code gets its own shallow copy as its globals.
+CONDITION_GLOBALS = {
+    'pd': pd,
+    'np': np,
+    'expand_monthly_mask': Backtester.expand_monthly_mask # Inject helper function
+}
+
+def _compile_condition(code, digest):
+    """Returns the `condition` function defined by code (None if it defines none), compiling each code once."""
+    with _condition_funcs_lock:
+        if digest in _condition_funcs:
+            _condition_funcs.move_to_end(digest)
+            return _condition_funcs[digest]
+
+    # Named pseudo-file so tracebacks point at the generated condition
+    code_obj = compile(code, f"<condition:{digest.hex()[:12]}>", 'exec')
+    # A private copy keeps one code's top-level names (helpers, constants) out of the others
+    scope = dict(CONDITION_GLOBALS)
+    exec(code_obj, scope)
+    condition_func = scope.get('condition')
+
+    with _condition_funcs_lock:
+        _condition_funcs[digest] = condition_func
+        if len(_condition_funcs) > CONDITION_FUNC_CACHE_MAX_SIZE:
+            _condition_funcs.popitem(last=False)
+    return condition_func
+
 def _execute_code(code, bt, custom_periods=None):
-    # Safe execution dictionary - Include Backtester helper methods in the scope!
-    local_scope = {
-        'pd': pd,
-        'expand_monthly_mask': bt.expand_monthly_mask # Inject helper function
-    }
+    digest = hashlib.blake2b(code.encode('utf-8'), digest_size=16).digest()
+    cache_key = ('code', digest, tuple(custom_periods) if custom_periods else None)
+    cached = _scenario_cache_get(bt, cache_key)
+    if cached is not None:
+        return cached
     
     try:
         # Execute the generated code to define the 'condition' function
-        exec(code, local_scope)
+        condition_func = _compile_condition(code, digest)
         
-        if 'condition' not in local_scope:
+        if condition_func is None:
             return {"error": "Generated code did not define 'condition' function"}
-            
-        condition_func = local_scope['condition']
         
         # Apply filter
         mask = bt.filter_dates(condition_func)
@@ -211,12 +377,14 @@ def _execute_code(code, bt, custom_periods=None):
         signals_df = bt.get_signals(mask, periods=periods)
         signals_data = format_signals(signals_df)
         
-        return {
+        result = {
             "results": results,
             "control": control_results,
             "signals": signals_data,
             "generated_code": code
         }
+        _scenario_cache_put(bt, cache_key, result)
+        return result
         
     except Exception as e:
         print(f"Error executing dynamic scenario: {e}")
@@ -239,18 +407,35 @@ def run_dynamic_scenario(query):
     if periods:
         print(f"Extracted periods: {periods}")
     
-    return _execute_code(code, bt, custom_periods=periods)
+    result = _execute_code(code, bt, custom_periods=periods)
+    if "error" in result:
+        # Don't keep serving code that doesn't run for this query
+        llm.forget_backtest_condition(query)
+    return result
+
+def _dumps_line(obj):
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8') + "\n"
+    return json.dumps(obj) + "\n"
+
+def _migrate_legacy_saved_queries():
+    """Converts saved_queries.json to the JSON-lines file once. Call with _saved_queries_lock held."""
+    if os.path.exists(SAVED_QUERIES_FILE) or not os.path.exists(LEGACY_SAVED_QUERIES_FILE):
+        return
+    with open(LEGACY_SAVED_QUERIES_FILE, 'r') as f:
+        try:
+            queries = json.load(f)
+        except json.JSONDecodeError:
+            queries = []
+    # Write to a temp file and rename so a crash never leaves a half-written file
+    tmp_path = SAVED_QUERIES_FILE + ".tmp"
+    with open(tmp_path, 'w') as f:
+        f.writelines(_dumps_line(q) for q in queries)
+    os.replace(tmp_path, SAVED_QUERIES_FILE)
+    print(f"Migrated {len(queries)} saved queries to {SAVED_QUERIES_FILE}")
 
 def save_custom_query(name, description, code, original_query):
     try:
-        queries = []
-        if os.path.exists(SAVED_QUERIES_FILE):
-            with open(SAVED_QUERIES_FILE, 'r') as f:
-                try:
-                    queries = json.load(f)
-                except json.JSONDecodeError:
-                    queries = []
-        
         new_query = {
             "id": str(uuid.uuid4()),
             "name": name,
@@ -259,13 +444,20 @@ def save_custom_query(name, description, code, original_query):
             "original_query": original_query
         }
         
-        queries.append(new_query)
-        
         # Ensure directory exists
         os.makedirs(os.path.dirname(SAVED_QUERIES_FILE), exist_ok=True)
         
-        with open(SAVED_QUERIES_FILE, 'w') as f:
-            json.dump(queries, f, indent=2)
+        with _saved_queries_lock:
+            _migrate_legacy_saved_queries()
+            # A single append of one line; existing queries are never rewritten
+            with open(SAVED_QUERIES_FILE, 'ab+') as f:
+                # Start on a fresh line if a previous append was cut short
+                if f.seek(0, os.SEEK_END) > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        f.write(b"\n")
+                f.write(_dumps_line(new_query).encode('utf-8'))
+            _saved_queries_cache['mtime'] = None
             
         return new_query
     except Exception as e:
@@ -273,13 +465,28 @@ def save_custom_query(name, description, code, original_query):
 
 def get_saved_queries():
     try:
-        if os.path.exists(SAVED_QUERIES_FILE):
-            with open(SAVED_QUERIES_FILE, 'r') as f:
-                try:
-                    return json.load(f)
-                except json.JSONDecodeError:
-                    return []
-        return []
+        with _saved_queries_lock:
+            _migrate_legacy_saved_queries()
+            try:
+                mtime = os.stat(SAVED_QUERIES_FILE).st_mtime_ns
+            except FileNotFoundError:
+                return []
+
+            if _saved_queries_cache['mtime'] != mtime:
+                queries = []
+                with open(SAVED_QUERIES_FILE, 'rb') as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        try:
+                            queries.append(orjson.loads(line) if orjson is not None else json.loads(line))
+                        except ValueError:
+                            # e.g. a line torn by a crash mid-append; skip it, keep the rest
+                            print("Skipping unreadable line in saved queries file")
+                _saved_queries_cache['data'] = queries
+                _saved_queries_cache['mtime'] = mtime
+            # Copy so callers can't mutate the cached list
+            return list(_saved_queries_cache['data'])
     except Exception as e:
         print(f"Error reading saved queries: {e}")
         return []
@@ -314,24 +521,34 @@ def run_daily_insight_generation():
         analysis['date'] = stats['date']
     
     # --- Validation & Iteration Loop ---
-    print(f"Validating {len(analysis.get('questions', []))} questions...")
-    validated_questions = []
-    
-    for q_idx, q_obj in enumerate(analysis.get('questions', [])):
-        current_question_text = q_obj['question']
-        is_valid = False
-        attempts = 0
-        max_attempts = 3
-        
-        while not is_valid and attempts < max_attempts:
-            print(f"  Processing Q{q_idx+1} (Attempt {attempts+1}): {current_question_text}")
-            
-            # 1. Generate Code for the current question text
-            llm_gen_result = llm.generate_backtest_condition(current_question_text)
-            
+    # Questions are validated in rounds: every LLM request a round needs (code generation,
+    # replacement questions) is sent concurrently, while the backtests themselves run one
+    # at a time against the shared data.
+    questions = analysis.get('questions', [])
+    print(f"Validating {len(questions)} questions...")
+    max_attempts = 3
+    current_texts = [q_obj['question'] for q_obj in questions]
+    attempts = [0] * len(questions)
+    valid_by_index = {}
+
+    pending = list(range(len(questions)))
+    conditions = llm.generate_backtest_conditions([current_texts[q_idx] for q_idx in pending])
+
+    while pending:
+        regenerate = []  # questions that go to the next round
+        failures = []    # (q_idx, failure_reason) needing a replacement question
+
+        for q_idx, llm_gen_result in zip(pending, conditions):
+            q_obj = questions[q_idx]
+            current_question_text = current_texts[q_idx]
+            print(f"  Processing Q{q_idx+1} (Attempt {attempts[q_idx]+1}): {current_question_text}")
+
+            # 1. Code for the current question text (generated for the whole round up front)
             if not llm_gen_result or not llm_gen_result.get('code'):
                 print("    -> Failed to generate code.")
-                attempts += 1
+                attempts[q_idx] += 1
+                if attempts[q_idx] < max_attempts:
+                    regenerate.append(q_idx)
                 continue
                 
             code = llm_gen_result['code']
@@ -348,16 +565,11 @@ def run_daily_insight_generation():
                 failure_reason = "Zero occurrences found in history"
             else:
                 # NEW CHECK: Check if the requested periods actually returned data
-                data_missing = False
-                missing_periods = []
                 results_dict = test_result.get('results', {})
+                missing_periods = [p_key for p_key, p_val in results_dict.items()
+                                   if p_key != 'count' and p_val == MISSING_DATA]
                 
-                for p_key, p_val in results_dict.items():
-                    if p_key != 'count' and p_val == "Data not available":
-                        data_missing = True
-                        missing_periods.append(p_key)
-                
-                if data_missing:
+                if missing_periods:
                     failure_reason = f"Data not available for periods: {', '.join(missing_periods)} (likely too recent or missing auxiliary data)"
                 else:
                     # Success!
@@ -367,33 +579,48 @@ def run_daily_insight_generation():
                     q_obj['periods'] = periods
                     q_obj['results'] = test_result # Save full execution results (charts, stats)
                     
-                    # NEW: Generate result interpretation
-                    print("    -> Generating result interpretation...")
-                    interpretation_result = llm.generate_result_interpretation(current_question_text, test_result)
-                    q_obj['result_explanation'] = interpretation_result.get('result_explanation', 'Results interpretation unavailable.')
-                    
-                    validated_questions.append(q_obj)
-                    is_valid = True
-                    continue # Break while loop
+                    valid_by_index[q_idx] = q_obj
+                    continue
             
             # If we are here, it failed
             print(f"    -> Failed: {failure_reason}")
-            attempts += 1
+            llm.forget_backtest_condition(current_question_text)
+            attempts[q_idx] += 1
             
-            if attempts < max_attempts:
-                # 4. Ask LLM for a replacement
-                print("    -> Requesting replacement question...")
-                replacement = llm.generate_replacement_question(stats, current_question_text, failure_reason)
+            if attempts[q_idx] < max_attempts:
+                failures.append((q_idx, failure_reason))
+
+        # 4. Ask the LLM for all of this round's replacements at once
+        if failures:
+            print(f"    -> Requesting {len(failures)} replacement question(s)...")
+            replacements = llm.generate_replacement_questions(
+                stats, [(current_texts[q_idx], reason) for q_idx, reason in failures]
+            )
+            for (q_idx, _), replacement in zip(failures, replacements):
                 if replacement and replacement.get('question'):
-                    current_question_text = replacement['question']
+                    current_texts[q_idx] = replacement['question']
                     # Update score and insight if provided
                     if 'predictive_score' in replacement:
-                        q_obj['predictive_score'] = replacement['predictive_score']
+                        questions[q_idx]['predictive_score'] = replacement['predictive_score']
                     if 'insight_explanation' in replacement:
-                        q_obj['insight_explanation'] = replacement['insight_explanation']
+                        questions[q_idx]['insight_explanation'] = replacement['insight_explanation']
+                    regenerate.append(q_idx)
                 else:
-                    print("    -> Failed to generate replacement.")
-                    break
+                    print(f"    -> Failed to generate replacement for Q{q_idx+1}.")
+
+        pending = sorted(regenerate)
+        conditions = llm.generate_backtest_conditions([current_texts[q_idx] for q_idx in pending])
+
+    validated_questions = [valid_by_index[q_idx] for q_idx in sorted(valid_by_index)]
+
+    # Generate result interpretations for all validated questions in parallel
+    if validated_questions:
+        print(f"Generating result interpretations for {len(validated_questions)} questions...")
+        interpretations = llm.generate_result_interpretations(
+            [(q_obj['question'], q_obj['results']) for q_obj in validated_questions]
+        )
+        for q_obj, interpretation_result in zip(validated_questions, interpretations):
+            q_obj['result_explanation'] = interpretation_result.get('result_explanation', 'Results interpretation unavailable.')
 
     # Update analysis with only valid questions
     analysis['questions'] = validated_questions
@@ -401,8 +628,14 @@ def run_daily_insight_generation():
     # Save to local cache file
     cache_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'daily_analysis.json')
     try:
-        with open(cache_file, 'w') as f:
-            json.dump(analysis, f, indent=2)
+        if orjson is not None:
+            # NaN/Infinity come out as null, numpy values are serialized without conversion
+            payload = orjson.dumps(analysis, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+            with open(cache_file, 'wb') as f:
+                f.write(payload)
+        else:
+            with open(cache_file, 'w') as f:
+                json.dump(analysis, f, indent=2)
         print(f"Daily analysis saved to {cache_file}")
     except Exception as e:
         print(f"Error saving daily analysis: {e}")
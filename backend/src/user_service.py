@@ -10,7 +10,7 @@ Uses SQLite for persistent storage.
 import os
 import sqlite3
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 from contextlib import contextmanager
 
@@ -170,6 +170,14 @@ def _init_db():
             )
         ''')
         
+        # Sent email log (dedupes re-sends of identical content to the same recipient)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS email_send_log (
+                send_key TEXT PRIMARY KEY,
+                sent_at TEXT NOT NULL
+            )
+        ''')
+        
         conn.commit()
 
 
@@ -1511,3 +1519,60 @@ def should_refresh_portfolio_news(user_id: str) -> Dict:
         "cached_news": cached,
         "hours_since_refresh": None
     }
+
+
+# ============== EMAIL SEND LOG ==============
+
+def get_recently_sent_keys(send_keys: List[str], within_hours: int = 24) -> set:
+    """
+    Return the subset of send_keys that were recorded as sent within the last `within_hours`.
+    A send key identifies (recipient, email content), so a match means the exact same
+    email already went out.
+    """
+    if not send_keys:
+        return set()
+    
+    cutoff = (datetime.now() - timedelta(hours=within_hours)).isoformat()
+    found = set()
+    
+    with _get_db() as conn:
+        cursor = conn.cursor()
+        # Stay under SQLite's bound-parameter limit
+        for i in range(0, len(send_keys), 500):
+            chunk = send_keys[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            cursor.execute(
+                f"SELECT send_key FROM email_send_log WHERE sent_at >= ? AND send_key IN ({placeholders})",
+                (cutoff, *chunk)
+            )
+            found.update(row["send_key"] for row in cursor.fetchall())
+    
+    return found
+
+
+def record_sent_emails(send_keys: List[str], retention_hours: int = 48) -> Dict:
+    """
+    Record send keys as sent now, and prune entries older than `retention_hours`.
+    """
+    if not send_keys:
+        return {"success": True, "recorded": 0}
+    
+    now = datetime.now()
+    now_str = now.isoformat()
+    cutoff = (now - timedelta(hours=retention_hours)).isoformat()
+    
+    try:
+        with _get_db() as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT INTO email_send_log (send_key, sent_at)
+                VALUES (?, ?)
+                ON CONFLICT(send_key) DO UPDATE SET sent_at = excluded.sent_at
+            ''', [(key, now_str) for key in send_keys])
+            cursor.execute("DELETE FROM email_send_log WHERE sent_at < ?", (cutoff,))
+            conn.commit()
+        
+        return {"success": True, "recorded": len(send_keys)}
+    
+    except Exception as e:
+        return {"error": f"Failed to record sent emails: {str(e)}"}
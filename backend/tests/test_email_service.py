@@ -0,0 +1,504 @@
+import unittest
+import sys
+import os
+import io
+import json
+import shutil
+import sqlite3
+import tempfile
+import smtplib
+import contextlib
+import numpy as np
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+from unittest.mock import patch
+
+# Add backend to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import email_service as E
+from src import user_service
+from src.user_service import create_user, get_recently_sent_keys, record_sent_emails
+
+
+DAILY_ANALYSIS = {
+    "date": "2026-01-05",
+    "intrigue_score": 72,
+    "summary": "Stocks drifted higher as the VIX eased.",
+    "top_news": ["Fed holds rates steady", "Oil slips on supply data"],
+    "questions": [
+        {
+            "question": "What happens after a 5% drop?",
+            "insight_explanation": "Sharp drops tend to mean-revert.",
+            "result_explanation": "Forward returns beat the baseline.",
+        }
+    ],
+}
+
+
+class FakeSMTP:
+    """Stands in for smtplib.SMTP; records every send_message call on the class."""
+    connections = []
+    refused = {}
+    fail_on = {}  # recipient email -> exception raised when a message includes it
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.logins = 0
+        self.sent = []
+        FakeSMTP.connections.append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        self.logins += 1
+
+    def send_message(self, msg, to_addrs=None):
+        for addr in to_addrs:
+            if addr in FakeSMTP.fail_on:
+                raise FakeSMTP.fail_on[addr]
+        self.sent.append((list(to_addrs), msg))
+        return {addr: FakeSMTP.refused[addr] for addr in to_addrs if addr in FakeSMTP.refused}
+
+
+class EmailTestCase(unittest.TestCase):
+    """Runs against a temporary users.db and daily_analysis.json with SMTP faked out."""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.analysis_file = os.path.join(self.test_dir, 'daily_analysis.json')
+        self.write_analysis(DAILY_ANALYSIS)
+
+        FakeSMTP.connections = []
+        FakeSMTP.refused = {}
+        FakeSMTP.fail_on = {}
+
+        patches = [
+            patch.object(user_service, 'DB_PATH', os.path.join(self.test_dir, 'users.db')),
+            patch.object(E, 'DAILY_ANALYSIS_FILE', self.analysis_file),
+            patch.object(E.smtplib, 'SMTP', FakeSMTP),
+            # Per-user sections fetch market data; they're not what these tests cover
+            patch.object(E, 'generate_watchlist_html', return_value=""),
+            patch.object(E, 'generate_portfolio_news_html', return_value=""),
+            patch.dict(os.environ, {
+                "EMAIL_USER": "sender@example.com",
+                "EMAIL_PASSWORD": "secret",
+                "EMAIL_RECIPIENT": "",
+            }),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+        user_service._init_db()
+        E._load_daily_analysis.cache_clear()
+
+    def tearDown(self):
+        E._load_daily_analysis.cache_clear()
+        shutil.rmtree(self.test_dir)
+
+    def write_analysis(self, data):
+        with open(self.analysis_file, 'w') as f:
+            json.dump(data, f)
+
+    def add_user(self, email, preferences):
+        result = create_user(email, preferences=preferences)
+        self.assertNotIn("error", result)
+
+    def deliveries(self):
+        return [delivery for conn in FakeSMTP.connections for delivery in conn.sent]
+
+    def delivered_to(self):
+        return sorted(addr for to_addrs, _ in self.deliveries() for addr in to_addrs)
+
+    def run_task(self, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            result = E.send_daily_email_task(**kwargs)
+        return result, out.getvalue()
+
+
+class TestSendLog(EmailTestCase):
+    def set_sent_at(self, key, when):
+        with sqlite3.connect(user_service.DB_PATH) as conn:
+            conn.execute("UPDATE email_send_log SET sent_at = ? WHERE send_key = ?", (when.isoformat(), key))
+
+    def logged_keys(self):
+        with sqlite3.connect(user_service.DB_PATH) as conn:
+            return {row[0] for row in conn.execute("SELECT send_key FROM email_send_log")}
+
+    def test_recently_sent_keys_window(self):
+        self.assertEqual(record_sent_emails(["a", "b"]), {"success": True, "recorded": 2})
+        self.set_sent_at("a", datetime.now() - timedelta(hours=25))
+
+        self.assertEqual(get_recently_sent_keys(["a", "b", "c"]), {"b"})
+        self.assertEqual(get_recently_sent_keys(["a", "b"], within_hours=26), {"a", "b"})
+        self.assertEqual(get_recently_sent_keys([]), set())
+
+    def test_record_refreshes_and_prunes(self):
+        record_sent_emails(["old", "kept"])
+        self.set_sent_at("old", datetime.now() - timedelta(hours=49))
+        self.set_sent_at("kept", datetime.now() - timedelta(hours=30))
+
+        record_sent_emails(["kept", "new"])
+
+        self.assertEqual(self.logged_keys(), {"kept", "new"})
+        # Re-recording moves the timestamp forward
+        self.assertEqual(get_recently_sent_keys(["kept"]), {"kept"})
+
+    def test_record_error_returned(self):
+        user_service.DB_PATH = self.test_dir  # a directory can't be opened as a database
+        result = record_sent_emails(["a"])
+        self.assertIn("error", result)
+
+
+class TestSendDedup(EmailTestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_user("quant@example.com", ["quantitative_analysis"])
+        self.add_user("overview@example.com", ["quantitative_analysis", "market_overview"])
+
+    def test_second_run_skips_recipients(self):
+        result, _ = self.run_task()
+        self.assertEqual(result, {"status": "success", "message": "Sent 2 emails"})
+        self.assertEqual(self.delivered_to(), ["overview@example.com", "quant@example.com"])
+
+        FakeSMTP.connections = []
+        result, _ = self.run_task()
+        self.assertEqual(result, {"status": "success", "message": "Sent 0 emails (all recipients already up to date)"})
+        self.assertEqual(FakeSMTP.connections, [])
+
+    def test_force_resends(self):
+        self.run_task()
+        FakeSMTP.connections = []
+
+        result, _ = self.run_task(force=True)
+        self.assertEqual(result, {"status": "success", "message": "Sent 2 emails"})
+        self.assertEqual(self.delivered_to(), ["overview@example.com", "quant@example.com"])
+
+    def test_changed_content_resent(self):
+        self.run_task()
+        FakeSMTP.connections = []
+
+        # Only the summary changes: quant@ doesn't receive it, so their email is unchanged
+        self.write_analysis(dict(DAILY_ANALYSIS, summary="Stocks fell sharply as the VIX jumped above 30."))
+        result, _ = self.run_task()
+        self.assertEqual(result, {"status": "success", "message": "Sent 1 emails"})
+        self.assertEqual(self.delivered_to(), ["overview@example.com"])
+
+    def test_personalized_key_changes_daily(self):
+        self.add_user("watch@example.com", ["quantitative_analysis", "watchlist_news"])
+        self.run_task()
+
+        FakeSMTP.connections = []
+        result, _ = self.run_task()
+        self.assertEqual(result["message"], "Sent 0 emails (all recipients already up to date)")
+
+        class Tomorrow(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return datetime.now(tz) + timedelta(days=1)
+
+        # Same analysis file the next day: only the watchlist recipient's email can differ
+        with patch.object(E, 'datetime', Tomorrow):
+            result, _ = self.run_task()
+        self.assertEqual(result, {"status": "success", "message": "Sent 1 emails"})
+        self.assertEqual(self.delivered_to(), ["watch@example.com"])
+
+    def test_failed_recipient_not_recorded(self):
+        FakeSMTP.refused = {"quant@example.com": (550, b"Mailbox unavailable")}
+        result, _ = self.run_task()
+        self.assertEqual(result["message"], "Sent 1 emails")
+
+        FakeSMTP.connections = []
+        FakeSMTP.refused = {}
+        result, _ = self.run_task()
+        self.assertEqual(result["message"], "Sent 1 emails")
+        self.assertEqual(self.delivered_to(), ["quant@example.com"])
+
+    def test_send_log_write_failure_reported(self):
+        def record_into_directory(keys):
+            with patch.object(user_service, 'DB_PATH', self.test_dir):
+                return record_sent_emails(keys)
+
+        with patch.object(E, 'record_sent_emails', side_effect=record_into_directory):
+            result, out = self.run_task()
+
+        # The emails still went out; the failure is only logged
+        self.assertEqual(result["message"], "Sent 2 emails")
+        self.assertIn("Email Service: Could not update send log: Failed to record sent emails", out)
+
+
+class TestSendEmailMessages(EmailTestCase):
+    def outgoing(self, n):
+        return [([f"user{i}@example.com"], MIMEText(f"body {i}"), "all (default)") for i in range(n)]
+
+    def send(self, outgoing, max_connections=None):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return E.send_email_messages(outgoing, "smtp.example.com", 587, "sender@example.com", "secret",
+                                         max_connections=max_connections)
+
+    def test_round_robin_batches(self):
+        sent, errors = self.send(self.outgoing(5), max_connections=2)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(sent), [f"user{i}@example.com" for i in range(5)])
+        batches = sorted([to for to, _ in conn.sent] for conn in FakeSMTP.connections)
+        self.assertEqual(batches, [
+            [["user0@example.com"], ["user2@example.com"], ["user4@example.com"]],
+            [["user1@example.com"], ["user3@example.com"]],
+        ])
+        # One login per connection, not per message
+        self.assertEqual([conn.logins for conn in FakeSMTP.connections], [1, 1])
+
+    def test_connections_capped(self):
+        self.send(self.outgoing(2), max_connections=4)
+        self.assertEqual(len(FakeSMTP.connections), 2)
+
+        FakeSMTP.connections = []
+        with patch.object(E, 'SMTP_MAX_CONNECTIONS', 3):
+            self.send(self.outgoing(7))
+        self.assertEqual(len(FakeSMTP.connections), 3)
+
+        FakeSMTP.connections = []
+        self.assertEqual(self.send([]), ([], []))
+        self.assertEqual(FakeSMTP.connections, [])
+
+    def test_multi_recipient_message(self):
+        msg = MIMEText("shared")
+        recipients = ["a@example.com", "b@example.com", "c@example.com"]
+        FakeSMTP.refused = {"b@example.com": (550, b"Mailbox unavailable")}
+
+        sent, errors = self.send([(recipients, msg, "headlines")])
+
+        # One message, every recipient on the envelope
+        self.assertEqual(self.deliveries(), [(recipients, msg)])
+        self.assertEqual(sorted(sent), ["a@example.com", "c@example.com"])
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors[0].startswith("b@example.com:"))
+
+    def test_message_failure_continues_batch(self):
+        FakeSMTP.fail_on = {"user1@example.com": smtplib.SMTPDataError(554, b"Rejected")}
+
+        sent, errors = self.send(self.outgoing(3), max_connections=1)
+
+        self.assertEqual(sent, ["user0@example.com", "user2@example.com"])
+        self.assertEqual(len(errors), 1)
+
+    def test_disconnect_aborts_batch(self):
+        FakeSMTP.fail_on = {"user1@example.com": smtplib.SMTPServerDisconnected("Connection unexpectedly closed")}
+
+        sent, errors = self.send(self.outgoing(3), max_connections=1)
+
+        self.assertEqual(sent, ["user0@example.com"])
+        self.assertEqual(errors, ["Connection unexpectedly closed"])
+
+    def test_connection_failure(self):
+        with patch.object(E.smtplib, 'SMTP', side_effect=ConnectionRefusedError("refused")):
+            sent, errors = self.send(self.outgoing(4), max_connections=2)
+
+        self.assertEqual(sent, [])
+        self.assertEqual(errors, ["refused", "refused"])
+
+
+class TestRecipientGrouping(EmailTestCase):
+    def messages_by_recipients(self):
+        return {tuple(sorted(to)): msg for to, msg in self.deliveries()}
+
+    def test_grouping_by_preferences(self):
+        self.add_user("a@example.com", ["quantitative_analysis", "headlines"])
+        self.add_user("b@example.com", ["headlines", "quantitative_analysis"])
+        self.add_user("solo@example.com", ["quantitative_analysis"])
+        self.add_user("watch1@example.com", ["quantitative_analysis", "watchlist_news"])
+        self.add_user("watch2@example.com", ["quantitative_analysis", "watchlist_news"])
+
+        result, _ = self.run_task()
+
+        self.assertEqual(result, {"status": "success", "message": "Sent 5 emails"})
+        messages = self.messages_by_recipients()
+        self.assertEqual(sorted(messages), [
+            ("a@example.com", "b@example.com"),
+            ("solo@example.com",),
+            ("watch1@example.com",),
+            ("watch2@example.com",),
+        ])
+        # Shared messages hide the recipient list; single-recipient ones are addressed normally
+        self.assertEqual(messages[("a@example.com", "b@example.com")].get_all('To'), ['undisclosed-recipients:;'])
+        self.assertEqual(messages[("solo@example.com",)]['To'], "solo@example.com")
+        self.assertEqual(messages[("watch1@example.com",)]['To'], "watch1@example.com")
+        self.assertEqual(messages[("watch2@example.com",)]['To'], "watch2@example.com")
+        for msg in messages.values():
+            self.assertIsNone(msg['Cc'])
+            self.assertIsNone(msg['Bcc'])
+            self.assertEqual(msg['From'], "sender@example.com")
+
+    def test_legacy_recipients_grouped(self):
+        self.add_user("a@example.com", ["quantitative_analysis"])
+        with patch.dict(os.environ, {"EMAIL_RECIPIENT": "legacy1@example.com, legacy2@example.com,a@example.com"}):
+            result, _ = self.run_task()
+
+        self.assertEqual(result["message"], "Sent 3 emails")
+        messages = self.messages_by_recipients()
+        # Legacy-only addresses have no preferences and share the full email;
+        # a legacy address that is also a user gets that user's email once
+        self.assertEqual(sorted(messages), [("a@example.com",), ("legacy1@example.com", "legacy2@example.com")])
+        self.assertEqual(messages[("legacy1@example.com", "legacy2@example.com")]['To'], 'undisclosed-recipients:;')
+
+
+def reference_glossary_terms(text):
+    """The original per-term substring check (glossary order)."""
+    return [(term, definition) for term, definition in E.GLOSSARY.items() if term.lower() in text]
+
+
+class TestGlossaryTerms(unittest.TestCase):
+    def terms(self, text):
+        return [term for term, _ in E.find_glossary_terms(text)]
+
+    def test_first_occurrence_order(self):
+        self.assertEqual(self.terms("the vix rose, the p/e fell and rsi stayed flat"), ["VIX", "P/E", "RSI"])
+        self.assertEqual(self.terms("rsi stayed flat, the p/e fell and the vix rose"), ["RSI", "P/E", "VIX"])
+
+    def test_terms_reported_once(self):
+        self.assertEqual(self.terms("vix up. vix down. win rate 60%, vix flat"), ["VIX", "Win Rate"])
+        self.assertEqual(self.terms("nothing to define here"), [])
+
+    def test_canonical_case_and_definition(self):
+        self.assertEqual(E.find_glossary_terms("a z-score of 2"), [("Z-Score", E.GLOSSARY["Z-Score"])])
+
+    def test_overlapping_terms(self):
+        # "rsi" appears inside "reversion"; the substring check reported both
+        self.assertEqual(self.terms("classic mean reversion setup"), ["Mean Reversion", "RSI"])
+        self.assertEqual(self.terms("the 50-day sma"), ["SMA"])
+
+    def test_matches_substring_check(self):
+        texts = [
+            "stocks drifted higher as the vix eased.",
+            "tnx up 12 basis points; the yield curve steepened while relative volume spiked",
+            "forward return vs baseline: win rate 64%, volatility muted, mean reversion likely",
+            "a z-score above 2 with rsi over 70 and price over the sma",
+            "",
+        ]
+        for text in texts:
+            self.assertEqual(sorted(E.find_glossary_terms(text)), sorted(reference_glossary_terms(text)), text)
+
+    def test_email_glossary_case_insensitive(self):
+        data = {
+            "summary": "The VIX spiked while Win Rate held.",
+            "top_news": ["Yields jump as the Yield Curve inverts"],
+            "questions": [],
+        }
+        with contextlib.redirect_stdout(io.StringIO()):
+            html, _ = E.build_email_html_for_user(data, "January 05, 2026", 72, None, [], [])
+
+        for term in ("VIX", "Win Rate", "Yield Curve"):
+            self.assertIn(f">{term}:</strong>", html)
+        self.assertLess(html.index(">VIX:</strong>"), html.index(">Win Rate:</strong>"))
+        self.assertNotIn(">RSI:</strong>", html)
+
+
+def reference_interestingness_score(stock):
+    """The original scalar scoring from get_top_interesting_stocks."""
+    score = 0
+    score += min(stock.get('news_count', 0) * 2, 10)
+    score += min(abs(stock.get('change_percent', 0) or 0) * 2, 10)
+    sentiment = stock.get('analysis', {}).get('sentiment', 'neutral')
+    if sentiment in ['very_positive', 'very_negative']:
+        score += 5
+    elif sentiment in ['positive', 'negative']:
+        score += 3
+    if stock.get('analysis', {}).get('summary'):
+        score += 2
+    return score
+
+
+def reference_top_interesting_stocks(stocks, max_stocks=3):
+    return sorted(stocks, key=reference_interestingness_score, reverse=True)[:max_stocks]
+
+
+# Several score ties (AAA/BBB at 12, CCC/JJJ at 11, EEE/FFF at 10, DDD/KKK/LLL at 2) to pin down tie order
+INTERESTING_STOCKS = [
+    {"ticker": "AAA", "news_count": 6, "change_percent": 1.0},
+    {"ticker": "BBB", "news_count": 1, "change_percent": -5.0, "analysis": {"sentiment": "neutral"}},
+    {"ticker": "CCC", "news_count": 1, "change_percent": 2.0, "analysis": {"sentiment": "very_negative", "summary": ""}},
+    {"ticker": "DDD", "news_count": 0, "change_percent": None, "analysis": {"summary": "Quiet day."}},
+    {"ticker": "EEE", "news_count": 3, "change_percent": 0.5, "analysis": {"sentiment": "positive"}},
+    {"ticker": "FFF", "news_count": 5},
+    {"ticker": "GGG", "news_count": 9, "change_percent": 12.3,
+     "analysis": {"sentiment": "very_positive", "summary": "Earnings beat."}},
+    {"ticker": "HHH", "news_count": 2, "change_percent": -0.25, "analysis": {"sentiment": "negative", "summary": "Guidance cut."}},
+    {"ticker": "III", "news_count": 0, "change_percent": 0.0},
+    {"ticker": "JJJ", "news_count": 4, "change_percent": -1.5, "analysis": {"sentiment": "mixed"}},
+    {"ticker": "KKK", "news_count": 0, "change_percent": 1.0, "analysis": {}},
+    {"ticker": "LLL", "news_count": 1, "change_percent": 0.0},
+]
+
+
+class TestInterestingStocks(unittest.TestCase):
+    def tickers(self, stocks):
+        return [s["ticker"] for s in stocks]
+
+    def test_scores_match_reference(self):
+        stocks = INTERESTING_STOCKS
+        analyses = [s.get('analysis', {}) for s in stocks]
+        scores = E._interestingness_scores(
+            np.array([s.get('news_count', 0) for s in stocks], dtype=np.float64),
+            np.array([s.get('change_percent', 0) or 0 for s in stocks], dtype=np.float64),
+            np.array([E._SENTIMENT_POINTS.get(a.get('sentiment', 'neutral'), 0) for a in analyses], dtype=np.float64),
+            np.array([bool(a.get('summary')) for a in analyses]),
+        )
+        self.assertEqual(scores.tolist(), [reference_interestingness_score(s) for s in stocks])
+
+    def test_top_stocks_match_reference(self):
+        for max_stocks in range(len(INTERESTING_STOCKS) + 2):
+            expected = reference_top_interesting_stocks(INTERESTING_STOCKS, max_stocks)
+            result = E.get_top_interesting_stocks(INTERESTING_STOCKS, max_stocks)
+            self.assertEqual(self.tickers(result), self.tickers(expected), max_stocks)
+            for got, want in zip(result, expected):
+                self.assertIs(got, want)
+
+    def test_tie_order(self):
+        # Ties at the cutoff keep the earliest stock, and tied stocks stay in input order
+        self.assertEqual(self.tickers(E.get_top_interesting_stocks(INTERESTING_STOCKS, 2)), ["GGG", "AAA"])
+        self.assertEqual(self.tickers(E.get_top_interesting_stocks(INTERESTING_STOCKS, 4)), ["GGG", "AAA", "BBB", "CCC"])
+        self.assertEqual(self.tickers(E.get_top_interesting_stocks(INTERESTING_STOCKS, 12)),
+                         ["GGG", "AAA", "BBB", "CCC", "JJJ", "EEE", "FFF", "HHH", "DDD", "KKK", "LLL", "III"])
+
+        tied = [{"ticker": t, "news_count": 1} for t in ("X", "Y", "Z")]
+        self.assertEqual(self.tickers(E.get_top_interesting_stocks(tied, 2)), ["X", "Y"])
+        self.assertEqual(self.tickers(E.get_top_interesting_stocks(list(reversed(tied)), 2)), ["Z", "Y"])
+
+    def test_randomized_parity(self):
+        rng = np.random.default_rng(7)
+        sentiments = ['very_positive', 'positive', 'neutral', 'negative', 'very_negative', 'mixed']
+        stocks = [
+            {
+                "ticker": f"T{i}",
+                "news_count": int(rng.integers(0, 7)),
+                "change_percent": float(rng.choice([0.0, 0.5, 1.0, 2.5, -3.0, 7.0])),
+                "analysis": {"sentiment": str(rng.choice(sentiments)), "summary": "x" if rng.random() < 0.5 else ""},
+            }
+            for i in range(200)
+        ]
+        for max_stocks in (1, 3, 10, 50, 200):
+            self.assertEqual(
+                self.tickers(E.get_top_interesting_stocks(stocks, max_stocks)),
+                self.tickers(reference_top_interesting_stocks(stocks, max_stocks)),
+            )
+
+    def test_edge_cases(self):
+        self.assertEqual(E.get_top_interesting_stocks([], 3), [])
+        self.assertEqual(E.get_top_interesting_stocks(INTERESTING_STOCKS, 0), [])
+        # analysis=None scores like a missing analysis (the original crashed on it)
+        stocks = [{"ticker": "A", "news_count": 1, "analysis": None}, {"ticker": "B", "news_count": 2}]
+        self.assertEqual(self.tickers(E.get_top_interesting_stocks(stocks, 3)), ["B", "A"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import unittest
+import sys
+import os
+import json
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from unittest.mock import patch
+
+# Add backend to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import services
+from src.services import format_signals, save_custom_query, get_saved_queries
+
+
+def reference_format_signals(signals_df):
+    """The original row-by-row implementation (without downsampling)."""
+    records = []
+    for index, row in signals_df.iterrows():
+        record = {
+            'date': index.strftime('%Y-%m-%d'),
+            'price': row['Adj Close']
+        }
+        for col in row.index:
+            if col.startswith('FwdReturn_'):
+                period = col.replace('FwdReturn_', '')
+                val = row[col]
+                if pd.isna(val) or np.isinf(val):
+                    record[period] = None
+                else:
+                    record[period] = val
+        records.append(record)
+    return records
+
+
+def make_signals(n):
+    index = pd.date_range('2000-01-03', periods=n, freq='B')
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'Adj Close': rng.uniform(100, 200, n),
+        'FwdReturn_1M': rng.normal(0, 0.05, n),
+        'FwdReturn_1Y': rng.normal(0, 0.2, n),
+    }, index=index)
+    df.iloc[::7, 1] = np.nan
+    df.iloc[::11, 2] = np.inf
+    df.iloc[::13, 2] = -np.inf
+    return df
+
+
+class TestFormatSignals(unittest.TestCase):
+    def test_matches_reference(self):
+        df = make_signals(200)
+        self.assertEqual(format_signals(df), reference_format_signals(df))
+
+    def test_output_is_plain_json(self):
+        records = format_signals(make_signals(50))
+        # No NaN/Infinity tokens and no numpy scalars
+        json.dumps(records, allow_nan=False)
+        self.assertIs(type(records[0]['price']), float)
+
+    def test_empty(self):
+        self.assertEqual(format_signals(make_signals(0)), [])
+
+    def test_downsampling_keeps_order_and_endpoints(self):
+        df = make_signals(500)
+        records = format_signals(df, max_samples=100)
+        self.assertEqual(len(records), 100)
+        dates = [r['date'] for r in records]
+        self.assertEqual(dates, sorted(dates))
+        self.assertEqual(len(set(dates)), 100)
+        self.assertEqual(dates[0], df.index[0].strftime('%Y-%m-%d'))
+        self.assertEqual(dates[-1], df.index[-1].strftime('%Y-%m-%d'))
+
+
+class TestSavedQueries(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.jsonl_path = os.path.join(self.tmpdir, 'saved_queries.jsonl')
+        self.legacy_path = os.path.join(self.tmpdir, 'saved_queries.json')
+        self.patches = [
+            patch.object(services, 'SAVED_QUERIES_FILE', self.jsonl_path),
+            patch.object(services, 'LEGACY_SAVED_QUERIES_FILE', self.legacy_path),
+            patch.dict(services._saved_queries_cache, {'mtime': None, 'data': []}),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in reversed(self.patches):
+            p.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def test_save_and_load(self):
+        self.assertEqual(get_saved_queries(), [])
+        first = save_custom_query('A', 'first', 'def condition(d): pass', 'query a')
+        second = save_custom_query('B', 'second', 'def condition(d): pass', 'query b')
+        self.assertNotIn('error', first)
+
+        queries = get_saved_queries()
+        self.assertEqual([q['id'] for q in queries], [first['id'], second['id']])
+        self.assertEqual(queries[1]['original_query'], 'query b')
+
+        # Callers get a copy, not the cached list
+        queries.clear()
+        self.assertEqual(len(get_saved_queries()), 2)
+
+    def test_migrates_legacy_file(self):
+        legacy = [{"id": "1", "name": "Old", "description": "", "code": "x", "original_query": "q"}]
+        with open(self.legacy_path, 'w') as f:
+            json.dump(legacy, f, indent=2)
+
+        self.assertEqual(get_saved_queries(), legacy)
+        self.assertTrue(os.path.exists(self.jsonl_path))
+
+        new = save_custom_query('New', '', 'y', 'q2')
+        self.assertEqual([q['id'] for q in get_saved_queries()], ["1", new['id']])
+
+    def test_skips_torn_line(self):
+        with open(self.jsonl_path, 'w') as f:
+            f.write('{"id": "1", "name": "Ok"}\n{"id": "2", "na')
+
+        # The next append starts on a fresh line instead of extending the torn one
+        new = save_custom_query('C', '', 'z', 'q3')
+        self.assertEqual([q['id'] for q in get_saved_queries()], ["1", new['id']])
+
+
+if __name__ == '__main__':
+    unittest.main()